@@ -45,6 +45,7 @@ setup(
             [
                 "files/sysmon.service",
                 "files/sysmon.timer",
+                "files/sysmon-scheduler.service",
                 "files/sysmon-cleanup.service",
                 "files/sysmon-cleanup.timer",
                 "files/sysmon-generate-blacklist.service",
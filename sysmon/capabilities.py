@@ -0,0 +1,175 @@
+"""Persistent cache of the SSH users and probes that systems support."""
+
+from __future__ import annotations
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional, Sequence
+
+from sysmon.config import get_config
+from sysmon.orm import Capability
+
+
+__all__ = [
+    "CACHED_PROBES",
+    "Capabilities",
+    "capability_cache_enabled",
+    "get_capabilities",
+    "load_capabilities",
+    "record_capabilities",
+]
+
+
+# Probes that are skipped while the system is known not to support them.
+CACHED_PROBES = frozenset({"sysinfo", "smartctl_full"})
+SSH_USER = "ssh_user"
+TTL = {SSH_USER: 168, "sysinfo": 24, "smartctl_full": 72}  # hours
+# Consecutive failures after which a probe is considered unsupported.
+# HTTP requests also fail on transient timeouts, smartctl does not.
+FAILURES = {"sysinfo": 3, "smartctl_full": 1}
+
+
+def capability_cache_enabled() -> bool:
+    """Determine whether the capabilities of systems are cached."""
+
+    return get_config().getboolean("capabilities", "enabled", fallback=False)
+
+
+def get_ttl(name: str) -> timedelta:
+    """Return the time after which a cached capability is re-verified,
+    configurable as "ttl" and per entry, e.g. "sysinfo_ttl".
+    """
+
+    config = get_config()
+    hours = config.getfloat("capabilities", "ttl", fallback=TTL[name])
+    return timedelta(
+        hours=config.getfloat("capabilities", f"{name}_ttl", fallback=hours)
+    )
+
+
+def get_max_failures(name: str) -> int:
+    """Return the amount of consecutive failures after which the probe
+    is cached as unsupported, configurable as "failures" and per probe,
+    e.g. "sysinfo_failures".
+    """
+
+    config = get_config()
+    failures = config.getint("capabilities", "failures", fallback=FAILURES[name])
+    return config.getint("capabilities", f"{name}_failures", fallback=failures)
+
+
+class Capabilities(NamedTuple):
+    """The cached capabilities of a system.
+
+    `current` holds the names of the entries that have not yet
+    expired, `stored` the names of all entries of the system
+    and `failures` the consecutive failures of its probes.
+    """
+
+    ssh_user: Optional[str] = None
+    current: frozenset[str] = frozenset()
+    stored: frozenset[str] = frozenset()
+    failures: dict[str, int] = {}
+
+    @property
+    def unsupported(self) -> frozenset[str]:
+        """Returns the names of the probes to skip."""
+        return frozenset(
+            probe
+            for probe in self.current & CACHED_PROBES
+            if self.failures.get(probe, 0) >= get_max_failures(probe)
+        )
+
+    def get_ssh_users(self, users: Sequence[str]) -> tuple[str, ...]:
+        """Returns the SSH users to try, the known working one first."""
+        return tuple(sorted(users, key=lambda user: user != self.ssh_user))
+
+    def update(
+        self, ssh_user: Optional[str], failures: dict[str, bool]
+    ) -> tuple[dict[str, str], set[str]]:
+        """Returns the entries to store and the names of the entries
+        to delete given the SSH user that logged in and whether the
+        probes that conclusively ran failed.
+        Failures are counted until the next success.
+        """
+        store, delete = {}, set()
+
+        if ssh_user is not None and (
+            ssh_user != self.ssh_user or SSH_USER not in self.current
+        ):
+            store[SSH_USER] = ssh_user
+
+        for probe, failed in failures.items():
+            if failed:
+                store[probe] = str(self.failures.get(probe, 0) + 1)
+            elif probe in self.stored:
+                delete.add(probe)
+
+        return store, delete
+
+
+def get_capabilities(
+    system: Optional[int] = None, now: Optional[datetime] = None
+) -> dict[int, Capabilities]:
+    """Returns the cached capabilities of all or the given system by system ID."""
+
+    now = now or datetime.now()
+    select = Capability.select()
+
+    if system is not None:
+        select = select.where(Capability.system == system)
+
+    entries = {}
+
+    for capability in select:
+        entries.setdefault(capability.system_id, []).append(capability)
+
+    return {
+        system: Capabilities(
+            ssh_user=next(
+                (entry.value for entry in capabilities if entry.name == SSH_USER),
+                None,
+            ),
+            current=frozenset(
+                entry.name for entry in capabilities if entry.expires > now
+            ),
+            stored=frozenset(entry.name for entry in capabilities),
+            failures={
+                entry.name: int(entry.value)
+                for entry in capabilities
+                if entry.name in CACHED_PROBES
+            },
+        )
+        for system, capabilities in entries.items()
+    }
+
+
+def load_capabilities(system: int) -> Capabilities:
+    """Returns the cached capabilities of the given system."""
+
+    if not capability_cache_enabled():
+        return Capabilities()
+
+    return get_capabilities(system).get(system, Capabilities())
+
+
+def record_capabilities(system: int, store: dict[str, str], delete: set[str]) -> None:
+    """Stores and deletes the given cache entries of the system."""
+
+    now = datetime.now()
+
+    if store:
+        Capability.insert_many(
+            [
+                {
+                    "system": system,
+                    "name": name,
+                    "value": value,
+                    "expires": now + get_ttl(name),
+                }
+                for name, value in store.items()
+            ]
+        ).on_conflict(preserve=[Capability.value, Capability.expires]).execute()
+
+    if delete:
+        Capability.delete().where(
+            (Capability.system == system) & (Capability.name << delete)
+        ).execute()
@@ -1,40 +1,26 @@
 """System checking."""
 
-from datetime import datetime, date
-
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio import run
 from functools import partial
-from json import dumps
-from multiprocessing import Pool
-from typing import Iterable, Optional
-from requests import post
-from requests.exceptions import ReadTimeout
-from threading import Thread
+from typing import Callable, Iterable, Optional
 
 from hwdb import System
 
+from sysmon.concurrency import ConcurrencyController, adaptive_concurrency_enabled
 from sysmon.config import LOGGER
-from sysmon.orm import CheckResults, NewestCheckResults
-
-from sysmon.checks.application import get_application_state
-from sysmon.checks.application import get_application_version
-from sysmon.checks.baytrail import get_baytrail_freeze_state
-from sysmon.checks.black_screen import get_blackscreen_since
-from sysmon.checks.common import get_last_check, get_sysinfo, get_application
-from sysmon.checks.efi import efi_mount_ok
-from sysmon.checks.icmp import check_icmp_request
-from sysmon.checks.iperf3 import measure_speed
-from sysmon.checks.meminfo import get_ram_available
-from sysmon.checks.meminfo import get_ram_free
-from sysmon.checks.meminfo import get_ram_total
-from sysmon.checks.offline import get_offline_since
-from sysmon.checks.root_partition import check_root_not_ro
-from sysmon.checks.sensors import check_system_sensors
-from sysmon.checks.logs import get_chromium_log, get_disk_usage, get_error_log, get_smartctl_full, parse_hd_uptime
-from sysmon.checks.smart import get_smart_results
-from sysmon.checks.ssh import check_ssh
-from sysmon.checks.synchronization import is_in_sync
-from sysmon.checks.touchscreen import count_recent_touch_events
-from sysmon.config import get_config
+from sysmon.latency import record_latencies
+from sysmon.enumerations import BandwidthPolicy
+from sysmon.orm import DATABASE, CheckResults, CheckTimeout, NewestCheckResults
+from sysmon.planner import plan
+from sysmon.smitrac import notify
+from sysmon.writer import CheckWriter
+
+from sysmon.checks.lanes import Lanes, lanes_enabled
+from sysmon.checks.pipeline import CHECK_KINDS, create_check_with_deadline
+from sysmon.checks.prefetch import Prefetched, prefetch, with_prefetched
+from sysmon.checks.recheck import RecheckThread, needs_recheck
+from sysmon.checks.runner import PROCESSES, DeadlinePool
 
 from hwdb.enumerations import Connection
 
@@ -44,168 +30,140 @@ __all__ = [
     "check_systems_bw_once_a_day",
     "check_system_bw_once_a_day",
     "create_check_no_bw",
+    "store_check_results",
 ]
 
 
-TCP_TIMEOUT = 5  # seconds
-
-
-def check_systems(systems: Iterable[System], *, chunk_size: int = 10) -> None:
+def check_systems(systems: Iterable[System]) -> None:
     """Checks the given systems."""
 
-    with Pool(processes=6) as pool:
-        try:
-            pool.map(
-                partial(check_system, nobwiflte=True), systems, chunksize=chunk_size
-            )
-        except Exception as e:
-            print(e, " Exception check_system pool.map")
+    try:
+        write_results(partial(check_system, nobwiflte=True), systems)
+    except Exception as e:
+        print(e, " Exception check_system pool.map")
 
 
-def check_systems_bw_once_a_day(
-    systems: Iterable[System], *, chunk_size: int = 10
-) -> None:
+def check_systems_bw_once_a_day(systems: Iterable[System]) -> None:
     """Checks the given systems. Bandwidth check once a day"""
 
-    with Pool(processes=6) as pool:
-        try:
-            pool.map(
-                partial(check_system_bw_once_a_day, nobwiflte=True),
-                systems,
-                chunksize=chunk_size,
-            )
-        except Exception as e:
-            print(e, " Exception check_systems_bw_once_a_day pool.map")
+    try:
+        write_results(partial(check_system_bw_once_a_day, nobwiflte=True), systems)
+    except Exception as e:
+        print(e, " Exception check_systems_bw_once_a_day pool.map")
+
 
+def write_results(
+    check_function: Callable[..., Optional[CheckResults]],
+    systems: Iterable[System],
+) -> None:
+    """Checks the systems in worker processes
+    and streams the results to a single writer.
+    """
+
+    systems = plan(systems)
+    prefetched = prefetch(systems)
+    items = [(system, prefetched.subset(system)) for system in systems]
+    systems = {system.id: system for system in systems}
+    controller = (
+        ConcurrencyController.from_config(PROCESSES)
+        if adaptive_concurrency_enabled()
+        else None
+    )
 
-def check_system(system: System, nobwiflte: Optional[bool] = False) -> CheckResults:
+    with CheckWriter(controller=controller) as writer, RecheckThread(
+        writer, prefetched
+    ) as rechecks, DeadlinePool(
+        partial(with_prefetched, partial(check_function, store=False)),
+        controller=controller,
+        lanes=Lanes.from_config() if lanes_enabled() else None,
+    ) as pool:
+        for system_check in pool.imap_unordered(items):
+            if system_check is None:
+                continue
+
+            writer.put(system_check)
+
+            if needs_recheck(system_check):
+                rechecks.put(systems[system_check.system_id], system_check)
+
+    if controller is not None:
+        LOGGER.info("Final concurrency: %i", controller.limit)
+
+    if pool.timed_out:
+        LOGGER.warning("Checks of systems timed out: %s", sorted(pool.timed_out))
+        CheckTimeout.record(pool.timed_out, pool.deadline)
+
+
+def check_system(
+    system: System,
+    nobwiflte: Optional[bool] = False,
+    *,
+    store: bool = True,
+    prefetched: Optional[Prefetched] = None,
+    kinds: frozenset[str] = CHECK_KINDS,
+) -> CheckResults:
     try:
         """Check the given system."""
         islte = False
         try:
             if nobwiflte and system.deployment.connection == Connection.LTE:
                 LOGGER.info("Checking LTE ( no bandwith test system: %i", system.id)
-                system_check = create_check(system, nobwiflte, islte)
+                system_check = create_check(
+                    system, nobwiflte, islte, prefetched=prefetched, kinds=kinds
+                )
                 islte = True
             else:
                 LOGGER.info("Checking system: %i", system.id)
-                system_check = create_check(system)
+                system_check = create_check(system, prefetched=prefetched, kinds=kinds)
         except AttributeError:
             LOGGER.info("Checking system: %i, no connection type found", system.id)
-            system_check = create_check(system)
+            system_check = create_check(system, prefetched=prefetched, kinds=kinds)
 
-        system_check.save()
+        if store:
+            store_check_results(system_check)
 
-        # delete old check and add newest check to db
-        NewestCheckResults.delete().where(
-            NewestCheckResults.system == system_check.system
-        ).execute()
-        newest_check_results = NewestCheckResults(
-            system=system_check.system,
-            icmp_request=system_check.icmp_request,
-            ssh_login=system_check.ssh_login,
-            http_request=system_check.http_request,
-            application_state=system_check.application_state,
-            smart_check=system_check.smart_check,
-            baytrail_freeze=system_check.baytrail_freeze,
-            fsck_repair=system_check.fsck_repair,
-            application_version=system_check.application_version,
-            efi_mount_ok=system_check.efi_mount_ok,
-            download=system_check.download,
-            upload=system_check.upload,
-            root_not_ro=system_check.root_not_ro,
-            sensors=system_check.sensors,
-            in_sync=system_check.in_sync,
-            recent_touch_events=system_check.recent_touch_events,
-            application_mode=system_check.application_mode,
-            error_log=system_check.error_log,
-            chromium_log=system_check.chromium_log,
-            smartctl_full=system_check.smartctl_full,
-            hd_uptime=system_check.hd_uptime,
-            hd_size=system_check.hd_size,
-            hd_free=system_check.hd_free,
-        )
-        newest_check_results.offline_since = system_check.offline_since
-        newest_check_results.save()
-        if get_config().get("smitrac", "enabled"):
-            try:
-                system_to_post = System.select(cascade=True).where(System.id == system_check.system.id).get()
-                data = dumps(
-                    {
-                        "customer": system_to_post.deployment.customer.id,
-                        "system": system_to_post.id,
-                        "password": get_config().get("smitrac", "apipassword"),
-                    }
-                )
-                Thread(target=post, kwargs={"url":  get_config().get("smitrac", "url"), "data": data}, daemon=True).start()
-            except Exception as e:
-                print(e, "error sending check to smitrac api system ", system_check.system.id)
         return system_check
+    except AsyncTimeoutError:
+        LOGGER.warning("Check of system %i exceeded its deadline.", system.id)
+        raise
     except Exception as e:
         print(e, "exception in check_system, systemid:", system.id)
 
 
 def check_system_no_bw(
-    system: System, nobwiflte: Optional[bool] = False
+    system: System,
+    nobwiflte: Optional[bool] = False,
+    *,
+    store: bool = True,
+    prefetched: Optional[Prefetched] = None,
 ) -> CheckResults:
     try:
         """Check the given system. No Bandwidth test"""
 
-        system_check = create_check_no_bw(system)
+        system_check = run(
+            create_check_with_deadline(
+                system, bandwidth=BandwidthPolicy.REUSE, prefetched=prefetched
+            )
+        )
 
-        system_check.save()
+        if store:
+            store_check_results(system_check)
 
-        # delete old check and add newest check to db
-        NewestCheckResults.delete().where(
-            NewestCheckResults.system == system_check.system
-        ).execute()
-        newest_check_results = NewestCheckResults(
-            system=system_check.system,
-            icmp_request=system_check.icmp_request,
-            ssh_login=system_check.ssh_login,
-            http_request=system_check.http_request,
-            application_state=system_check.application_state,
-            smart_check=system_check.smart_check,
-            baytrail_freeze=system_check.baytrail_freeze,
-            fsck_repair=system_check.fsck_repair,
-            application_version=system_check.application_version,
-            efi_mount_ok=system_check.efi_mount_ok,
-            download=system_check.download,
-            upload=system_check.upload,
-            root_not_ro=system_check.root_not_ro,
-            sensors=system_check.sensors,
-            in_sync=system_check.in_sync,
-            recent_touch_events=system_check.recent_touch_events,
-            application_mode=system_check.application_mode,
-            error_log=system_check.error_log,
-            chromium_log=system_check.chromium_log,
-            smartctl_full=system_check.smartctl_full,
-            hd_uptime=system_check.hd_uptime,
-            hd_size=system_check.hd_size,
-            hd_free=system_check.hd_free,
-        )
-        newest_check_results.offline_since = system_check.offline_since
-        newest_check_results.save()
-        if get_config().get("smitrac", "enabled"):
-            try:
-                system_to_post = System.select(cascade=True).where(System.id == system_check.system.id).get()
-                data = dumps(
-                    {
-                        "customer": system_to_post.deployment.customer.id,
-                        "system": system_to_post.id,
-                        "password": get_config().get("smitrac", "apipassword"),
-                    }
-                )
-                Thread(target=post, kwargs={"url":  get_config().get("smitrac", "url"), "data": data}, daemon=True).start()
-            except Exception as e:
-                print(e, "error sending check to smitrac api system ", system_check.system.id)
         return system_check
+    except AsyncTimeoutError:
+        LOGGER.warning("Check of system %i exceeded its deadline.", system.id)
+        raise
     except Exception as e:
         print(e, "exception in check_system, systemid:", system.id)
 
 
 def check_system_bw_once_a_day(
-    system: System, nobwiflte: Optional[bool] = False
+    system: System,
+    nobwiflte: Optional[bool] = False,
+    *,
+    store: bool = True,
+    prefetched: Optional[Prefetched] = None,
+    kinds: frozenset[str] = CHECK_KINDS,
 ) -> CheckResults:
     try:
         """Check the given system. Bandwidth test once a day"""
@@ -213,466 +171,100 @@ def check_system_bw_once_a_day(
         try:
             if nobwiflte and system.deployment.connection == Connection.LTE:
                 LOGGER.info("Checking LTE ( no bandwith test system: %i", system.id)
-                system_check = create_check_bw_once_a_day(system, nobwiflte, islte)
+                system_check = create_check_bw_once_a_day(
+                    system, nobwiflte, islte, prefetched=prefetched, kinds=kinds
+                )
                 islte = True
             else:
                 LOGGER.info("Checking system: %i", system.id)
-                system_check = create_check_bw_once_a_day(system)
+                system_check = create_check_bw_once_a_day(
+                    system, prefetched=prefetched, kinds=kinds
+                )
         except AttributeError:
             LOGGER.info("Checking system: %i, no connection type found", system.id)
-            system_check = create_check_bw_once_a_day(system)
+            system_check = create_check_bw_once_a_day(
+                system, prefetched=prefetched, kinds=kinds
+            )
 
-        system_check.save()
+        if store:
+            store_check_results(system_check)
 
-        # delete old check and add newest check to db
-        NewestCheckResults.delete().where(
-            NewestCheckResults.system == system_check.system
-        ).execute()
-        newest_check_results = NewestCheckResults(
-            system=system_check.system,
-            icmp_request=system_check.icmp_request,
-            ssh_login=system_check.ssh_login,
-            http_request=system_check.http_request,
-            application_state=system_check.application_state,
-            smart_check=system_check.smart_check,
-            baytrail_freeze=system_check.baytrail_freeze,
-            fsck_repair=system_check.fsck_repair,
-            application_version=system_check.application_version,
-            efi_mount_ok=system_check.efi_mount_ok,
-            download=system_check.download,
-            upload=system_check.upload,
-            root_not_ro=system_check.root_not_ro,
-            sensors=system_check.sensors,
-            in_sync=system_check.in_sync,
-            recent_touch_events=system_check.recent_touch_events,
-            application_mode=system_check.application_mode,
-            error_log=system_check.error_log,
-            chromium_log=system_check.chromium_log,
-            smartctl_full=system_check.smartctl_full,
-            hd_uptime=system_check.hd_uptime,
-            hd_size=system_check.hd_size,
-            hd_free=system_check.hd_free,
-        )
-        newest_check_results.offline_since = system_check.offline_since
-        newest_check_results.save()
-        if get_config().get("smitrac", "enabled"):
-            try:
-                system_to_post = System.select(cascade=True).where(System.id == system_check.system.id).get()
-                data = dumps(
-                    {
-                        "customer": system_to_post.deployment.customer.id,
-                        "system": system_to_post.id,
-                        "password": get_config().get("smitrac", "apipassword"),
-                    }
-                )
-                Thread(target=post, kwargs={"url":  get_config().get("smitrac", "url"), "data": data}, daemon=True).start()
-            except ReadTimeout:
-                pass
         return system_check
+    except AsyncTimeoutError:
+        LOGGER.warning("Check of system %i exceeded its deadline.", system.id)
+        raise
     except Exception as e:
         print(e, "exception in check_system, systemid:", system.id)
 
 
+def store_check_results(system_check: CheckResults) -> None:
+    """Stores the check results, updates the newest check
+    results and probe latencies and notifies the smitrac API.
+    """
+
+    with DATABASE.atomic():
+        system_check.save()
+        NewestCheckResults.upsert(system_check)
+        record_latencies([system_check])
+
+    notify(system_check)
+
+
 def create_check(
-    system: System, nobwiflte: Optional[bool] = False, islte: Optional[bool] = False
+    system: System,
+    nobwiflte: Optional[bool] = False,
+    islte: Optional[bool] = False,
+    *,
+    prefetched: Optional[Prefetched] = None,
+    kinds: frozenset[str] = CHECK_KINDS,
 ) -> CheckResults:
     """Checks a system."""
 
-    now = datetime.now()
-    try:
-        http_request, sysinfo = get_sysinfo(system)
-    except Exception as e:
-        print(e, system.id)
-    error_log = get_error_log(system)
-    chromium_log = get_chromium_log(system)
-    smartctl_full = get_smartctl_full(system)
-    hd_uptime = parse_hd_uptime(smartctl_full)
-    hd_size, hd_free = get_disk_usage(system)
-    if system.ddb_os:
-        if nobwiflte and islte:
-            check_results = CheckResults(
-                system=system,
-                icmp_request=check_icmp_request(system, timeout=TCP_TIMEOUT),
-                ssh_login=check_ssh(system, timeout=TCP_TIMEOUT),
-                http_request=http_request,
-                application_state=get_application_state(sysinfo),
-                smart_check=get_smart_results(sysinfo),
-                baytrail_freeze=get_baytrail_freeze_state(sysinfo),
-                fsck_repair=sysinfo.get("cmdline", {}).get("fsck.repair"),
-                application_version=get_application_version(sysinfo),
-                efi_mount_ok=efi_mount_ok(sysinfo),
-                root_not_ro=check_root_not_ro(sysinfo),
-                sensors=check_system_sensors(sysinfo),
-                in_sync=is_in_sync(system, now),
-                recent_touch_events=count_recent_touch_events(system.deployment, now),
-                application_mode=get_application(system),
-                error_log=error_log,
-                chromium_log=chromium_log,
-                smartctl_full=smartctl_full,
-                hd_uptime=hd_uptime,
-                hd_size=hd_size,
-                hd_free=hd_free,
-            )
-        else:
-            check_results = CheckResults(
-                system=system,
-                icmp_request=check_icmp_request(system, timeout=TCP_TIMEOUT),
-                ssh_login=check_ssh(system, timeout=TCP_TIMEOUT),
-                http_request=http_request,
-                application_state=get_application_state(sysinfo),
-                smart_check=get_smart_results(sysinfo),
-                baytrail_freeze=get_baytrail_freeze_state(sysinfo),
-                fsck_repair=sysinfo.get("cmdline", {}).get("fsck.repair"),
-                application_version=get_application_version(sysinfo),
-                efi_mount_ok=efi_mount_ok(sysinfo),
-                download=measure_speed(system),
-                upload=measure_speed(system, reverse=True),
-                root_not_ro=check_root_not_ro(sysinfo),
-                sensors=check_system_sensors(sysinfo),
-                in_sync=is_in_sync(system, now),
-                recent_touch_events=count_recent_touch_events(system.deployment, now),
-                application_mode=get_application(system),
-                error_log=error_log,
-                chromium_log=chromium_log,
-                smartctl_full=smartctl_full,
-                hd_uptime=hd_uptime,
-                hd_size=hd_size,
-                hd_free=hd_free,
-            )
-    else:
-        if nobwiflte and islte:
-            check_results = CheckResults(
-                system=system,
-                icmp_request=check_icmp_request(system, timeout=TCP_TIMEOUT),
-                ssh_login=check_ssh(system, timeout=TCP_TIMEOUT),
-                http_request=http_request,
-                application_state=get_application_state(sysinfo),
-                smart_check=get_smart_results(sysinfo),
-                baytrail_freeze=get_baytrail_freeze_state(sysinfo),
-                fsck_repair=sysinfo.get("cmdline", {}).get("fsck.repair"),
-                application_version=get_application_version(sysinfo),
-                ram_total=get_ram_total(sysinfo),
-                ram_free=get_ram_free(sysinfo),
-                ram_available=get_ram_available(sysinfo),
-                efi_mount_ok=efi_mount_ok(sysinfo),
-                root_not_ro=check_root_not_ro(sysinfo),
-                sensors=check_system_sensors(sysinfo),
-                recent_touch_events=count_recent_touch_events(system.deployment, now),
-                application_mode=get_application(system),
-                error_log=error_log,
-                chromium_log=chromium_log,
-                smartctl_full=smartctl_full,
-                hd_uptime=hd_uptime,
-                hd_size=hd_size,
-                hd_free=hd_free,
-            )
-        else:
-            check_results = CheckResults(
-                system=system,
-                icmp_request=check_icmp_request(system, timeout=TCP_TIMEOUT),
-                ssh_login=check_ssh(system, timeout=TCP_TIMEOUT),
-                http_request=http_request,
-                application_state=get_application_state(sysinfo),
-                smart_check=get_smart_results(sysinfo),
-                baytrail_freeze=get_baytrail_freeze_state(sysinfo),
-                fsck_repair=sysinfo.get("cmdline", {}).get("fsck.repair"),
-                application_version=get_application_version(sysinfo),
-                ram_total=get_ram_total(sysinfo),
-                ram_free=get_ram_free(sysinfo),
-                ram_available=get_ram_available(sysinfo),
-                efi_mount_ok=efi_mount_ok(sysinfo),
-                download=measure_speed(system),
-                upload=measure_speed(system, reverse=True),
-                root_not_ro=check_root_not_ro(sysinfo),
-                sensors=check_system_sensors(sysinfo),
-                recent_touch_events=count_recent_touch_events(system.deployment, now),
-                application_mode=get_application(system),
-                error_log=error_log,
-                chromium_log=chromium_log,
-                smartctl_full=smartctl_full,
-                hd_uptime=hd_uptime,
-                hd_size=hd_size,
-                hd_free=hd_free,
-            )
-
-    try:
-        last_check = get_last_check(system)
-    except CheckResults.DoesNotExist:
-        last_check = None
-
-    check_results.offline_since = get_offline_since(check_results, last_check)
-    check_results.blackscreen_since = get_blackscreen_since(check_results, last_check)
-    check_results.offline_since = get_offline_since(check_results, last_check)
-    check_results.save()
-    if get_config().get("smitrac", "enabled"):
-        try:
-            system_to_post = System.select(cascade=True).where(System.id == check_results.system.id).get()
-            data = dumps(
-                {
-                    "customer": system_to_post.deployment.customer.id,
-                    "system": system_to_post.id,
-                    "password": get_config().get("smitrac", "apipassword"),
-                }
-            )
-            Thread(target=post, kwargs={"url": get_config().get("smitrac", "url"), "data": data}, daemon=True).start()
-        except Exception as e:
-            print(e, "error sending check to smitrac api system ", system_check.system.id)
-    return check_results
+    return run(
+        create_check_with_deadline(
+            system,
+            bandwidth=(
+                BandwidthPolicy.SKIP if nobwiflte and islte else BandwidthPolicy.CACHED
+            ),
+            prefetched=prefetched,
+            kinds=kinds,
+        )
+    )
 
 
 def create_check_no_bw(
-    system: System, nobwiflte: Optional[bool] = False, islte: Optional[bool] = False
+    system: System,
+    nobwiflte: Optional[bool] = False,
+    islte: Optional[bool] = False,
+    *,
+    prefetched: Optional[Prefetched] = None,
 ) -> CheckResults:
     """Checks a system."""
 
-    now = datetime.now()
-    try:
-        http_request, sysinfo = get_sysinfo(system)
-    except Exception as e:
-        print(e, system.id)
-    error_log = get_error_log(system)
-    chromium_log = get_chromium_log(system)
-    smartctl_full = get_smartctl_full(system)
-    hd_uptime = parse_hd_uptime(smartctl_full)
-    hd_size, hd_free = get_disk_usage(system)
-    if system.ddb_os:
-        check_results = CheckResults(
-            system=system,
-            icmp_request=check_icmp_request(system, timeout=TCP_TIMEOUT),
-            ssh_login=check_ssh(system, timeout=TCP_TIMEOUT),
-            http_request=http_request,
-            application_state=get_application_state(sysinfo),
-            smart_check=get_smart_results(sysinfo),
-            baytrail_freeze=get_baytrail_freeze_state(sysinfo),
-            fsck_repair=sysinfo.get("cmdline", {}).get("fsck.repair"),
-            application_version=get_application_version(sysinfo),
-            efi_mount_ok=efi_mount_ok(sysinfo),
-            root_not_ro=check_root_not_ro(sysinfo),
-            sensors=check_system_sensors(sysinfo),
-            in_sync=is_in_sync(system, now),
-            recent_touch_events=count_recent_touch_events(system.deployment, now),
-            application_mode=get_application(system),
-            error_log=error_log,
-            chromium_log=chromium_log,
-            smartctl_full=smartctl_full,
-            hd_uptime=hd_uptime,
-            hd_size=hd_size,
-            hd_free=hd_free,
+    check_results = run(
+        create_check_with_deadline(
+            system, bandwidth=BandwidthPolicy.REUSE, prefetched=prefetched
         )
-    else:
-        check_results = CheckResults(
-            system=system,
-            icmp_request=check_icmp_request(system, timeout=TCP_TIMEOUT),
-            ssh_login=check_ssh(system, timeout=TCP_TIMEOUT),
-            http_request=http_request,
-            application_state=get_application_state(sysinfo),
-            smart_check=get_smart_results(sysinfo),
-            baytrail_freeze=get_baytrail_freeze_state(sysinfo),
-            fsck_repair=sysinfo.get("cmdline", {}).get("fsck.repair"),
-            application_version=get_application_version(sysinfo),
-            ram_total=get_ram_total(sysinfo),
-            ram_free=get_ram_free(sysinfo),
-            ram_available=get_ram_available(sysinfo),
-            efi_mount_ok=efi_mount_ok(sysinfo),
-            root_not_ro=check_root_not_ro(sysinfo),
-            sensors=check_system_sensors(sysinfo),
-            recent_touch_events=count_recent_touch_events(system.deployment, now),
-            application_mode=get_application(system),
-            error_log=error_log,
-            chromium_log=chromium_log,
-            smartctl_full=smartctl_full,
-            hd_uptime=hd_uptime,
-            hd_size=hd_size,
-            hd_free=hd_free,
-        )
-
-    try:
-        last_check = get_last_check(system)
-    except CheckResults.DoesNotExist:
-        last_check = None
-    if last_check is not None:
-        check_results.upload = last_check.upload
-        check_results.download = last_check.download
-    check_results.save()
-
-    NewestCheckResults.delete().where(
-        NewestCheckResults.system == check_results.system
-    ).execute()
-    newest_check_results = NewestCheckResults(
-        system=check_results.system,
-        icmp_request=check_results.icmp_request,
-        ssh_login=check_results.ssh_login,
-        http_request=check_results.http_request,
-        application_state=check_results.application_state,
-        smart_check=check_results.smart_check,
-        baytrail_freeze=check_results.baytrail_freeze,
-        fsck_repair=check_results.fsck_repair,
-        application_version=check_results.application_version,
-        efi_mount_ok=check_results.efi_mount_ok,
-        download=check_results.download,
-        upload=check_results.upload,
-        root_not_ro=check_results.root_not_ro,
-        sensors=check_results.sensors,
-        in_sync=check_results.in_sync,
-        recent_touch_events=check_results.recent_touch_events,
-        application_mode=check_results.application_mode,
-        error_log=check_results.error_log,
-        chromium_log=check_results.chromium_log,
-        smartctl_full=check_results.smartctl_full,
-        hd_uptime=check_results.hd_uptime,
-        hd_size=check_results.hd_size,
-        hd_free=check_results.hd_free,
     )
-    newest_check_results.offline_since = check_results.offline_since
-    newest_check_results.save()
-    if get_config().get("smitrac", "enabled"):
-        try:
-            system_to_post = System.select(cascade=True).where(System.id == check_results.system.id).get()
-            data = dumps(
-                {
-                    "customer": system_to_post.deployment.customer.id,
-                    "system": system_to_post.id,
-                    "password": get_config().get("smitrac", "apipassword"),
-                }
-            )
-            Thread(target=post, kwargs={"url": get_config().get("smitrac", "url"), "data": data}, daemon=True).start()
-        except Exception as e:
-            print(e,"error sending check to smitrac api system ", check_results.system.id)
-
+    store_check_results(check_results)
     return check_results
 
 
 def create_check_bw_once_a_day(
-    system: System, nobwiflte: Optional[bool] = False, islte: Optional[bool] = False
+    system: System,
+    nobwiflte: Optional[bool] = False,
+    islte: Optional[bool] = False,
+    *,
+    prefetched: Optional[Prefetched] = None,
+    kinds: frozenset[str] = CHECK_KINDS,
 ) -> CheckResults:
-    """Check the given system. Bandwidth Check once a day"""
-    now = datetime.now()
-    try:
-        http_request, sysinfo = get_sysinfo(system)
-    except Exception as e:
-        print(e, system.id)
-    error_log = get_error_log(system)
-    chromium_log = get_chromium_log(system)
-    smartctl_full = get_smartctl_full(system)
-    hd_uptime = parse_hd_uptime(smartctl_full)
-    hd_size, hd_free = get_disk_usage(system)
-    if system.ddb_os:
-        if nobwiflte and islte:
-            check_results = CheckResults(
-                system=system,
-                icmp_request=check_icmp_request(system, timeout=TCP_TIMEOUT),
-                ssh_login=check_ssh(system, timeout=TCP_TIMEOUT),
-                http_request=http_request,
-                application_state=get_application_state(sysinfo),
-                smart_check=get_smart_results(sysinfo),
-                baytrail_freeze=get_baytrail_freeze_state(sysinfo),
-                fsck_repair=sysinfo.get("cmdline", {}).get("fsck.repair"),
-                application_version=get_application_version(sysinfo),
-                efi_mount_ok=efi_mount_ok(sysinfo),
-                root_not_ro=check_root_not_ro(sysinfo),
-                sensors=check_system_sensors(sysinfo),
-                in_sync=is_in_sync(system, now),
-                recent_touch_events=count_recent_touch_events(system.deployment, now),
-                application_mode=get_application(system),
-                error_log=error_log,
-                chromium_log=chromium_log,
-                smartctl_full=smartctl_full,
-                hd_uptime=hd_uptime,
-                hd_size=hd_size,
-                hd_free=hd_free,
-            )
-        else:
-            check_results = CheckResults(
-                system=system,
-                icmp_request=check_icmp_request(system, timeout=TCP_TIMEOUT),
-                ssh_login=check_ssh(system, timeout=TCP_TIMEOUT),
-                http_request=http_request,
-                application_state=get_application_state(sysinfo),
-                smart_check=get_smart_results(sysinfo),
-                baytrail_freeze=get_baytrail_freeze_state(sysinfo),
-                fsck_repair=sysinfo.get("cmdline", {}).get("fsck.repair"),
-                application_version=get_application_version(sysinfo),
-                efi_mount_ok=efi_mount_ok(sysinfo),
-                root_not_ro=check_root_not_ro(sysinfo),
-                sensors=check_system_sensors(sysinfo),
-                in_sync=is_in_sync(system, now),
-                recent_touch_events=count_recent_touch_events(system.deployment, now),
-                application_mode=get_application(system),
-                error_log=error_log,
-                chromium_log=chromium_log,
-                smartctl_full=smartctl_full,
-                hd_uptime=hd_uptime,
-                hd_size=hd_size,
-                hd_free=hd_free,
-            )
-    else:
-        if nobwiflte and islte:
-            check_results = CheckResults(
-                system=system,
-                icmp_request=check_icmp_request(system, timeout=TCP_TIMEOUT),
-                ssh_login=check_ssh(system, timeout=TCP_TIMEOUT),
-                http_request=http_request,
-                application_state=get_application_state(sysinfo),
-                smart_check=get_smart_results(sysinfo),
-                baytrail_freeze=get_baytrail_freeze_state(sysinfo),
-                fsck_repair=sysinfo.get("cmdline", {}).get("fsck.repair"),
-                application_version=get_application_version(sysinfo),
-                ram_total=get_ram_total(sysinfo),
-                ram_free=get_ram_free(sysinfo),
-                ram_available=get_ram_available(sysinfo),
-                efi_mount_ok=efi_mount_ok(sysinfo),
-                root_not_ro=check_root_not_ro(sysinfo),
-                sensors=check_system_sensors(sysinfo),
-                recent_touch_events=count_recent_touch_events(system.deployment, now),
-                application_mode=get_application(system),
-                error_log=error_log,
-                chromium_log=chromium_log,
-                smartctl_full=smartctl_full,
-                hd_uptime=hd_uptime,
-                hd_size=hd_size,
-                hd_free=hd_free,
-            )
-        else:
-            check_results = CheckResults(
-                system=system,
-                icmp_request=check_icmp_request(system, timeout=TCP_TIMEOUT),
-                ssh_login=check_ssh(system, timeout=TCP_TIMEOUT),
-                http_request=http_request,
-                application_state=get_application_state(sysinfo),
-                smart_check=get_smart_results(sysinfo),
-                baytrail_freeze=get_baytrail_freeze_state(sysinfo),
-                fsck_repair=sysinfo.get("cmdline", {}).get("fsck.repair"),
-                application_version=get_application_version(sysinfo),
-                ram_total=get_ram_total(sysinfo),
-                ram_free=get_ram_free(sysinfo),
-                ram_available=get_ram_available(sysinfo),
-                efi_mount_ok=efi_mount_ok(sysinfo),
-                root_not_ro=check_root_not_ro(sysinfo),
-                sensors=check_system_sensors(sysinfo),
-                recent_touch_events=count_recent_touch_events(system.deployment, now),
-                application_mode=get_application(system),
-                error_log=error_log,
-                chromium_log=chromium_log,
-                smartctl_full=smartctl_full,
-                hd_uptime=hd_uptime,
-                hd_size=hd_size,
-                hd_free=hd_free,
-            )
-    try:
-        last_check = get_last_check(system)
-    except CheckResults.DoesNotExist:
-        last_check = None
-
-    """If last check is from today no bandwidth check"""
-    if (last_check is not None) and (last_check.timestamp.date().day == now.day):
-        check_results.upload = last_check.upload
-        check_results.download = last_check.download
-        LOGGER.info("Use Bandwidth check from last check for System: %i", system.id)
-    else:
-        check_results.upload = measure_speed(system)
-        check_results.download = measure_speed(system, reverse=True)
-        LOGGER.info("New Bandwidth check for System: %i", system.id)
-
-    check_results.offline_since = get_offline_since(check_results, last_check)
-    check_results.blackscreen_since = get_blackscreen_since(check_results, last_check)
-    return check_results
+    """Check the given system. Bandwidth check once per bandwidth TTL."""
+
+    return run(
+        create_check_with_deadline(
+            system,
+            bandwidth=BandwidthPolicy.CACHED,
+            prefetched=prefetched,
+            kinds=kinds,
+        )
+    )
@@ -1,12 +1,17 @@
 """Common functions."""
 
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio import create_subprocess_exec, get_running_loop, wait_for
+from contextlib import suppress
+from contextvars import copy_context
 from pathlib import Path
 from re import fullmatch
-from typing import Any
+from threading import Thread
+from typing import Any, Callable, Optional, Sequence, TypeVar, Union
 
 from requests import ConnectionError, ReadTimeout, Timeout
 
-from subprocess import CalledProcessError, TimeoutExpired
+from subprocess import DEVNULL, PIPE, CalledProcessError, TimeoutExpired
 from requests.exceptions import ConnectTimeout
 
 
@@ -16,17 +21,24 @@ from hwdb import System
 from sysmon.enumerations import SuccessFailedUnsupported
 from sysmon.orm import CheckResults
 
+from sysmon.checks.transfer import count_transfer
+
 import requests
 
 __all__ = [
     "extract_package_version",
     "get_last_check",
     "get_sysinfo",
+    "get_sysinfo_async",
     "get_application",
+    "get_application_async",
+    "run_async",
+    "to_daemon_thread",
 ]
 
 
 REPO_DIR = Path("/srv/http/de/homeinfo/mirror/prop/pacman")
+T = TypeVar("T")
 
 
 def extract_package_version(regex: str, *, repo: Path = REPO_DIR) -> str:
@@ -60,6 +72,8 @@ def get_sysinfo(
     except (ConnectionError, ReadTimeout, Timeout, ReadTimeoutError):
         return SuccessFailedUnsupported.UNSUPPORTED, {}
 
+    count_transfer(received=len(response.content))
+
     if response.status_code != 200:
         return SuccessFailedUnsupported.FAILED, {}
     temp_return = response.json()
@@ -78,6 +92,7 @@ def get_application(system: System):
     """returns the application mode"""
     try:
         application = system.application()
+        count_transfer(received=len(application.content))
         result = application.json()
     except Exception:
         return False
@@ -85,3 +100,92 @@ def get_application(system: System):
         return result
     else:
         return result["mode"]
+
+
+async def get_sysinfo_async(
+    system: System, *, timeout: int = 15
+) -> tuple[SuccessFailedUnsupported, dict[str, Any]]:
+    """Returns the system info dict per HTTP request without blocking the loop."""
+
+    return await to_daemon_thread(get_sysinfo, system, timeout=timeout)
+
+
+async def get_application_async(system: System):
+    """Returns the application mode without blocking the loop."""
+
+    return await to_daemon_thread(get_application, system)
+
+
+async def run_async(
+    command: Sequence[str],
+    *,
+    timeout: Optional[float] = None,
+    text: bool = True,
+    capture: bool = True,
+) -> Union[str, bytes]:
+    """Run a command as an asynchronous subprocess and return its stdout.
+
+    Mirrors subprocess.run(..., check=True) by raising CalledProcessError
+    and TimeoutExpired. The process is killed on timeout or cancellation.
+    If capture is False, stdout is discarded, which is required for
+    commands that leave a daemon holding on to it.
+    """
+
+    process = await create_subprocess_exec(
+        *command, stdin=DEVNULL, stdout=PIPE if capture else DEVNULL, stderr=DEVNULL
+    )
+
+    try:
+        stdout, _ = await wait_for(process.communicate(), timeout)
+    except AsyncTimeoutError:
+        raise TimeoutExpired(command, timeout) from None
+    finally:
+        if process.returncode is None:
+            with suppress(ProcessLookupError):
+                process.kill()
+
+            await process.wait()
+
+    if process.returncode != 0:
+        raise CalledProcessError(process.returncode, command, stdout)
+
+    if stdout is None:
+        stdout = b""
+
+    return stdout.decode(errors="replace") if text else stdout
+
+
+async def to_daemon_thread(function: Callable[..., T], /, *args, **kwargs) -> T:
+    """Run a blocking function in a daemon thread and await its result.
+
+    Like asyncio.to_thread(), the function runs in a copy of the current
+    context. Other than asyncio.to_thread(), a hanging call (e.g. an HTTP
+    request to a system that never closes the connection) neither occupies
+    the default executor nor blocks the event loop's shutdown.
+    """
+
+    loop = get_running_loop()
+    future = loop.create_future()
+
+    def resolve(result: Any, error: Optional[BaseException]) -> None:
+        if future.done():
+            return
+
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def target() -> None:
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as error:
+            result, exception = None, error
+        else:
+            exception = None
+
+        with suppress(RuntimeError):  # Event loop already closed.
+            loop.call_soon_threadsafe(resolve, result, exception)
+
+    Thread(target=copy_context().run, args=(target,), daemon=True).start()
+    return await future
@@ -1,12 +1,22 @@
 """ICMP echo request checks."""
 
+from re import search
 from subprocess import CalledProcessError, TimeoutExpired
-from typing import Optional
+from typing import Optional, Union
 
 from hwdb import System
 
+from sysmon.checks.common import run_async
+from sysmon.checks.transfer import count_transfer
 
-__all__ = ["check_icmp_request"]
+
+__all__ = ["check_icmp_request", "check_icmp_request_async"]
+
+
+PING = "/usr/bin/ping"
+PING_COUNT = 3
+PACKET_SIZE = r"\((\d+)\) bytes of data"  # incl. IP header
+STATISTICS = r"(\d+) packets transmitted, (\d+) received"
 
 
 def check_icmp_request(system: System, timeout: Optional[int] = None) -> bool:
@@ -18,3 +28,46 @@ def check_icmp_request(system: System, timeout: Optional[int] = None) -> bool:
         return False
 
     return True
+
+
+async def check_icmp_request_async(
+    system: System, timeout: Optional[int] = None
+) -> bool:
+    """Pings the system asynchronously.
+    The packets that ping reports are accounted as transfer.
+    Pings that time out are not accounted, as they report nothing.
+    """
+
+    try:
+        output = await run_async(
+            [PING, "-c", str(PING_COUNT), str(system.ip_address)], timeout=timeout
+        )
+    except CalledProcessError as error:
+        count_packets(error.output)
+        return False
+    except TimeoutExpired:
+        return False
+
+    count_packets(output)
+    return True
+
+
+def count_packets(output: Optional[Union[str, bytes]]) -> None:
+    """Accounts the echo requests and replies from the output of ping."""
+
+    if isinstance(output, bytes):
+        output = output.decode(errors="replace")
+
+    if not output:
+        return
+
+    if (size := search(PACKET_SIZE, output)) is None:
+        return
+
+    if (statistics := search(STATISTICS, output)) is None:
+        return
+
+    transmitted, received = map(int, statistics.groups())
+    count_transfer(
+        sent=transmitted * int(size.group(1)), received=received * int(size.group(1))
+    )
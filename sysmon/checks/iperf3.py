@@ -1,17 +1,113 @@
 """iperf speed measurement."""
 
+from __future__ import annotations
+from asyncio import sleep
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from fcntl import LOCK_EX, LOCK_NB, flock
+from json import loads
+from pathlib import Path
 from subprocess import CalledProcessError, TimeoutExpired
-from typing import Optional
+from tempfile import gettempdir
+from time import monotonic
+from typing import Any, AsyncIterator, NamedTuple, Optional, TextIO
 
 from hwdb import System
 
-from sysmon.iperf3 import iperf3
+from sysmon.checks.common import run_async
+from sysmon.checks.transfer import count_transfer
+from sysmon.config import get_config
+from sysmon.iperf3 import get_iperf3_command, iperf3
 
 
-__all__ = ["measure_speed"]
+__all__ = [
+    "Bandwidth",
+    "BandwidthScheduler",
+    "get_bandwidth_ttl",
+    "measure_bandwidth_async",
+    "measure_speed",
+    "measure_speed_async",
+]
 
 
 IPERF_TIMEOUT = 15  # seconds
+MAX_CONCURRENT = 2
+POLL_INTERVAL = 1  # seconds
+BANDWIDTH_TTL = 24  # hours
+
+
+class Bandwidth(NamedTuple):
+    """Result of a bandwidth measurement.
+    Queue and test time are None if nothing was measured now.
+    """
+
+    download: Optional[int] = None  # kbps
+    upload: Optional[int] = None  # kbps
+    queue_time: Optional[float] = None  # seconds
+    test_time: Optional[float] = None  # seconds
+    timestamp: Optional[datetime] = None  # of the measurement
+
+
+class BandwidthScheduler:
+    """Caps the amount of concurrent iperf3 runs across all
+    collector processes on this host.
+
+    Each running test holds an exclusive lock on one of `slots`
+    lock files. The locks are released by the kernel if the
+    holding process dies.
+    """
+
+    def __init__(
+        self,
+        slots: int = MAX_CONCURRENT,
+        directory: Optional[Path] = None,
+        *,
+        poll_interval: float = POLL_INTERVAL,
+    ):
+        self.slots = slots
+        self.directory = directory or Path(gettempdir()) / "sysmon-iperf3"
+        self.poll_interval = poll_interval
+
+    @classmethod
+    def from_config(cls) -> BandwidthScheduler:
+        """Creates a scheduler from the configuration file."""
+        config = get_config()
+        directory = config.get("iperf3", "lock_dir", fallback=None)
+        return cls(
+            config.getint("iperf3", "max_concurrent", fallback=MAX_CONCURRENT),
+            None if directory is None else Path(directory),
+            poll_interval=config.getfloat(
+                "iperf3", "poll_interval", fallback=POLL_INTERVAL
+            ),
+        )
+
+    def try_acquire(self) -> Optional[TextIO]:
+        """Locks a free slot and returns its lock file, if any."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        for slot in range(self.slots):
+            file = (self.directory / f"slot{slot}.lock").open("w")
+
+            try:
+                flock(file, LOCK_EX | LOCK_NB)
+            except BlockingIOError:
+                file.close()
+                continue
+
+            return file
+
+        return None
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[float]:
+        """Waits for a free slot and yields the queue wait in seconds."""
+        start = monotonic()
+
+        while (file := self.try_acquire()) is None:
+            await sleep(self.poll_interval)
+
+        with file:
+            yield monotonic() - start
 
 
 def measure_speed(
@@ -24,4 +120,79 @@ def measure_speed(
     except (CalledProcessError, TimeoutExpired):
         return None
 
+    return get_kbps(result)
+
+
+async def measure_speed_async(
+    system: System, *, reverse: bool = False, timeout: Optional[int] = IPERF_TIMEOUT
+) -> Optional[int]:
+    """Measure the up- or download speed of the system in kbps asynchronously."""
+
+    try:
+        result = loads(
+            await run_async(
+                get_iperf3_command(system.ip_address, reverse=reverse),
+                timeout=timeout,
+            )
+        )
+    except (CalledProcessError, TimeoutExpired):
+        return None
+
+    if reverse:
+        count_transfer(received=get_bytes(result))
+    else:
+        count_transfer(sent=get_bytes(result))
+
+    return get_kbps(result)
+
+
+def get_bandwidth_ttl(system: System) -> timedelta:
+    """Return the time for which a bandwidth measurement of the system
+    stays valid, configurable per connection type, e.g. "ttl_lte".
+    """
+
+    config = get_config()
+    hours = config.getfloat("bandwidth", "ttl", fallback=BANDWIDTH_TTL)
+
+    try:
+        connection = system.deployment.connection
+    except AttributeError:
+        connection = None
+
+    if connection is not None:
+        hours = config.getfloat(
+            "bandwidth", f"ttl_{connection.name.lower()}", fallback=hours
+        )
+
+    return timedelta(hours=hours)
+
+
+async def measure_bandwidth_async(
+    system: System,
+    *,
+    scheduler: Optional[BandwidthScheduler] = None,
+    timeout: Optional[int] = IPERF_TIMEOUT,
+) -> Bandwidth:
+    """Measure download and upload of the system in one scheduler slot."""
+
+    scheduler = scheduler or BandwidthScheduler.from_config()
+
+    async with scheduler.acquire() as queue_time:
+        start = monotonic()
+        download = await measure_speed_async(system, timeout=timeout)
+        upload = await measure_speed_async(system, reverse=True, timeout=timeout)
+        test_time = monotonic() - start
+
+    return Bandwidth(download, upload, queue_time, test_time, datetime.now())
+
+
+def get_kbps(result: dict[str, Any]) -> int:
+    """Return the receiver's speed in kbps from an iperf3 JSON result."""
+
     return round(result["end"]["streams"][0]["receiver"]["bits_per_second"] / 1024)
+
+
+def get_bytes(result: dict[str, Any]) -> int:
+    """Return the bytes the receiver got from an iperf3 JSON result."""
+
+    return result["end"]["streams"][0]["receiver"].get("bytes", 0)
@@ -0,0 +1,98 @@
+"""Concurrency lanes and transfer budgets per connection type."""
+
+from __future__ import annotations
+from typing import Optional
+
+from hwdb import System
+
+from sysmon.config import LOGGER, get_config
+from sysmon.orm import CheckResults
+
+from sysmon.checks.pipeline import CHECK_KINDS, LIGHT_KINDS
+from sysmon.checks.transfer import get_connection
+
+
+__all__ = ["Lanes", "lanes_enabled"]
+
+
+# Connection types with own lanes and their concurrency.
+LANES = {"lte": 10}
+
+
+def lanes_enabled() -> bool:
+    """Determine whether systems are checked in lanes per connection type."""
+
+    return get_config().getboolean("collector", "lanes", fallback=False)
+
+
+class Lanes:
+    """Separate concurrency limits and per-run transfer budgets
+    for systems of certain connection types, e.g. LTE.
+    Systems of other connection types use the wide lane.
+    """
+
+    def __init__(self, limits: dict[str, int], budgets: dict[str, Optional[int]]):
+        self.limits = limits
+        self.budgets = budgets
+        self.transferred = dict.fromkeys(limits, 0)
+
+    @classmethod
+    def from_config(cls) -> Lanes:
+        """Creates the lanes from the configuration file.
+        Lanes are configured as "<connection> = <concurrency>" and
+        their budgets in MiB per run as "<connection>_budget".
+        """
+        config = get_config()
+        limits = dict(LANES)
+
+        if config.has_section("lanes"):
+            limits.update(
+                (key, config.getint("lanes", key))
+                for key in config.options("lanes")
+                if not key.endswith("_budget")
+            )
+
+        limits = {lane: limit for lane, limit in limits.items() if limit > 0}
+        budgets = {}
+
+        for lane in limits:
+            budget = config.getfloat("lanes", f"{lane}_budget", fallback=None)
+            budgets[lane] = None if budget is None else round(budget * 1024 * 1024)
+
+        return cls(limits, budgets)
+
+    def get_lane(self, system: System) -> Optional[str]:
+        """Returns the lane of the system or None for the wide lane."""
+        if (connection := get_connection(system)) in self.limits:
+            return connection
+
+        return None
+
+    def exhausted(self, lane: Optional[str]) -> bool:
+        """Determine whether the lane used up its transfer budget."""
+        if (budget := self.budgets.get(lane)) is None:
+            return False
+
+        return self.transferred[lane] >= budget
+
+    def get_kinds(self, system: System) -> frozenset[str]:
+        """Returns the kinds of checks to run on the system.
+        Systems in lanes that used up their budget are only checked lightly.
+        """
+        if self.exhausted(self.get_lane(system)):
+            return LIGHT_KINDS
+
+        return CHECK_KINDS
+
+    def record(self, system: System, check_results: CheckResults) -> None:
+        """Adds the bytes that the check transferred to the system's lane."""
+        if (lane := self.get_lane(system)) is None:
+            return
+
+        exhausted = self.exhausted(lane)
+        self.transferred[lane] += check_results.transferred
+
+        if not exhausted and self.exhausted(lane):
+            LOGGER.warning(
+                "Transfer budget of lane %s used up. Checking lightly.", lane
+            )
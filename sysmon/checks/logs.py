@@ -1,16 +1,41 @@
 """Log collection via SSH."""
 
 import re
+from base64 import b64decode
+from binascii import Error as BinasciiError
+from datetime import datetime, timedelta
+from gzip import BadGzipFile, decompress
 from json import JSONDecodeError, loads
+from shlex import quote
 from subprocess import PIPE, CalledProcessError, TimeoutExpired, run
-from typing import Optional
+from typing import NamedTuple, Optional, Sequence, Union
+from zlib import error as ZlibError
 
 from hwdb import OperatingSystem, System
 
+from sysmon.checks.common import run_async
+from sysmon.checks.ssh import SSHSession
+from sysmon.checks.transfer import count_transfer
 from sysmon.config import get_config
+from sysmon.orm import LogState
 
 
-__all__ = ["get_error_log", "get_chromium_log", "get_smartctl_full", "parse_hd_uptime", "get_disk_usage"]
+__all__ = [
+    "LogBundle",
+    "get_log_bundle",
+    "get_log_bundle_async",
+    "get_error_log",
+    "get_error_log_async",
+    "get_error_log_incremental_async",
+    "get_chromium_log",
+    "get_chromium_log_async",
+    "get_chromium_log_incremental_async",
+    "get_smartctl_full",
+    "get_smartctl_full_async",
+    "parse_hd_uptime",
+    "get_disk_usage",
+    "get_disk_usage_async",
+]
 
 
 SSH_USERS = ("root", "homeinfo")
@@ -22,6 +47,48 @@ CHROM_KERN_RE = re.compile(
     re.IGNORECASE,
 )
 CHROM_NOISE_RE = re.compile(r":VERBOSE\d+:|:INFO:|:WARNING:|org\.chromium\.")
+ERROR_LOG_IGNORED = ("sshd", "hidslcfg", "watchdog")
+CHROMIUM_LOG_COMMAND = f"cat {CHROMIUM_LOG_PATH} 2>/dev/null"
+# Remote pre-filters. They pass a superset of the lines kept by
+# _filter_error_log() and _filter_chromium_log(), which still run locally.
+# Binary input is treated as text, so that grep prints the lines themselves.
+ERROR_LOG_REMOTE_FILTER = "LC_ALL=C grep -a -v -F " + " ".join(
+    f"-e {pattern}" for pattern in ERROR_LOG_IGNORED
+)
+CHROMIUM_LOG_REMOTE_FILTER = (
+    "LC_ALL=C grep -a -i -e chrome -e chromium -e renderer -e 'gpu.process'"
+    " | LC_ALL=C grep -a -v -E ':VERBOSE[0-9]+:|:INFO:|:WARNING:|org\\.chromium\\.'"
+)
+CHROMIUM_TAIL_BYTES = 1024 * 1024
+ERROR_LOG_WINDOW = timedelta(days=4)
+ERROR_LOG_MAX_BYTES = 60 * 1024  # stored window, fits into a TEXT column
+JOURNAL_CURSOR_PREFIX = "-- cursor: "
+JOURNAL_RESET_MARKER = "-- cursor invalid"
+SMARTCTL_COMMAND = (
+    "/usr/bin/smartctl -a --json /dev/sda 2>/dev/null"
+    " || /usr/bin/smartctl -a --json /dev/nvme0 2>/dev/null"
+)
+DISK_USAGE_COMMAND = (
+    "df -BM / | awk 'NR==2 {gsub(/M/,\"\",$2); gsub(/M/,\"\",$4); print $2, $4}'"
+)
+# Prints {"<section>": {"rc": <exit code>, "out": "<base64 gzip stdout>"}, ...}
+# Stdout goes to a file, since command substitution would drop NUL bytes
+# and trailing newlines, and is compressed to offset the base64 overhead.
+BUNDLE_SECTION_FUNCTION = (
+    "section() { out=$(mktemp); \"$1\" > \"$out\"; rc=$?; "
+    "printf '\"%s\":{\"rc\":%d,\"out\":\"%s\"}' "
+    "\"$1\" \"$rc\" \"$(gzip -c < \"$out\" | base64 -w0)\"; rm -f \"$out\"; }"
+)
+
+
+class LogBundle(NamedTuple):
+    """Logs, SMART data and disk usage collected in one SSH round trip."""
+
+    error_log: Optional[str] = None
+    chromium_log: Optional[str] = None
+    smartctl_full: Optional[str] = None
+    hd_size: Optional[int] = None
+    hd_free: Optional[int] = None
 
 
 def _ssh_command(system: System, user: str, remote_cmd: str) -> list[str]:
@@ -37,19 +104,25 @@ def _ssh_command(system: System, user: str, remote_cmd: str) -> list[str]:
     ]
 
 
-def _run_ssh(system: System, remote_cmd: str) -> Optional[str]:
+def _run_ssh(
+    system: System,
+    remote_cmd: str,
+    *,
+    text: bool = True,
+    users: Sequence[str] = SSH_USERS,
+) -> Optional[Union[str, bytes]]:
     """Run a command on the system via SSH, return stdout or None on failure."""
     if system.operating_system not in SSH_CAPABLE_OSS:
         return None
 
-    for user in SSH_USERS:
+    for user in users:
         try:
             result = run(
                 _ssh_command(system, user, remote_cmd),
                 check=True,
                 stdout=PIPE,
                 stderr=PIPE,
-                text=True,
+                text=text,
                 timeout=SSH_TIMEOUT + 20,
             )
             return result.stdout
@@ -59,33 +132,388 @@ def _run_ssh(system: System, remote_cmd: str) -> Optional[str]:
     return None
 
 
-def get_error_log(
-    system: System, *, since: str = "4 days ago", max_lines: int = 150
+async def _run_ssh_async(
+    system: System,
+    remote_cmd: str,
+    *,
+    session: Optional[SSHSession] = None,
+    text: bool = True,
+    users: Sequence[str] = SSH_USERS,
+) -> Optional[Union[str, bytes]]:
+    """Like _run_ssh() but as an asynchronous subprocess.
+    If a session is given, the command is run over its master connection.
+    """
+    if system.operating_system not in SSH_CAPABLE_OSS:
+        return None
+
+    if session is not None:
+        return _counted(
+            remote_cmd,
+            await session.run(remote_cmd, timeout=SSH_TIMEOUT + 20, text=text),
+        )
+
+    for user in users:
+        try:
+            return _counted(
+                remote_cmd,
+                await run_async(
+                    _ssh_command(system, user, remote_cmd),
+                    timeout=SSH_TIMEOUT + 20,
+                    text=text,
+                ),
+            )
+        except (CalledProcessError, TimeoutExpired):
+            count_transfer(sent=len(remote_cmd.encode()))
+            continue
+
+    return None
+
+
+def _counted(
+    remote_cmd: str, output: Optional[Union[str, bytes]]
+) -> Optional[Union[str, bytes]]:
+    """Counts the payload of a command that returned output."""
+    if output is not None:
+        count_transfer(
+            sent=len(remote_cmd.encode()),
+            received=len(output.encode() if isinstance(output, str) else output),
+        )
+
+    return output
+
+
+def remote_filter_enabled() -> bool:
+    """Determine whether logs shall be filtered
+    and compressed on the system before transfer.
+    """
+    return get_config().getboolean("logs", "remote_filter", fallback=False)
+
+
+def _filtered(command: str, remote_filter: Optional[str]) -> str:
+    if remote_filter is None or not remote_filter_enabled():
+        return command
+
+    return f"{{ {command}; }} | {remote_filter}"
+
+
+def _compressed(command: str) -> str:
+    return f"{{ {command}; }} | gzip -c"
+
+
+def _decompress(output: Optional[bytes], text: bool) -> Optional[Union[str, bytes]]:
+    if output is None:
+        return None
+
+    try:
+        output = decompress(output)
+    except (BadGzipFile, EOFError, ZlibError):
+        return None
+
+    return output.decode(errors="replace") if text else output
+
+
+def _fetch(
+    system: System, command: str, remote_filter: Optional[str] = None
 ) -> Optional[str]:
-    """Fetch critical journald entries from the system via SSH."""
-    output = _run_ssh(
-        system,
-        f"/usr/bin/journalctl --priority=crit --since '{since}' --no-pager -o short-iso",
+    """Run the command via SSH, filtering and compressing
+    its output on the system if configured.
+    """
+    if not remote_filter_enabled():
+        return _run_ssh(system, command)
+
+    return _decompress(
+        _run_ssh(
+            system, _compressed(_filtered(command, remote_filter)), text=False
+        ),
+        True,
+    )
+
+
+async def _fetch_async(
+    system: System,
+    command: str,
+    remote_filter: Optional[str] = None,
+    *,
+    session: Optional[SSHSession] = None,
+    text: bool = True,
+) -> Optional[Union[str, bytes]]:
+    """Like _fetch() but via asynchronous SSH."""
+    if not remote_filter_enabled():
+        return await _run_ssh_async(system, command, session=session, text=text)
+
+    return _decompress(
+        await _run_ssh_async(
+            system,
+            _compressed(_filtered(command, remote_filter)),
+            session=session,
+            text=False,
+        ),
+        text,
+    )
+
+
+def _error_log_command(since: str) -> str:
+    return (
+        f"/usr/bin/journalctl --priority=crit --since '{since}' --no-pager -o short-iso"
     )
+
+
+def _bundle_command(
+    since: str,
+    log_state: Optional[LogState] = None,
+    skip: frozenset[str] = frozenset(),
+) -> str:
+    sections = {
+        "error_log": _filtered(
+            _error_log_command(since)
+            if log_state is None
+            else _error_log_increment_command(log_state, since),
+            ERROR_LOG_REMOTE_FILTER,
+        ),
+        "chromium_log": (
+            _filtered(CHROMIUM_LOG_COMMAND, CHROMIUM_LOG_REMOTE_FILTER)
+            if log_state is None
+            else _chromium_log_increment_command(log_state)
+        ),
+        "smartctl_full": SMARTCTL_COMMAND,
+        "disk_usage": DISK_USAGE_COMMAND,
+    }
+    return _bundle_script(
+        {name: command for name, command in sections.items() if name not in skip}
+    )
+
+
+def _bundle_script(sections: dict[str, str]) -> str:
+    """Return a shell script that runs the commands as named sections.
+    Each section runs in a subshell, so that an exiting command
+    only fails its own section.
+    """
+    return "\n".join(
+        [
+            BUNDLE_SECTION_FUNCTION,
+            *(f"{name}() ( {command} )" for name, command in sections.items()),
+            "printf '{'",
+            "; printf ','; ".join(f"section {name}" for name in sections),
+            "printf '}'",
+        ]
+    )
+
+
+def _parse_bundle(output: Optional[str]) -> dict[str, bytes]:
+    """Return the stdout of each successful section of the bundle."""
+    if output is None:
+        return {}
+
+    try:
+        sections = loads(output)
+    except JSONDecodeError:
+        return {}
+
+    result = {}
+
+    for name, section in sections.items():
+        if section.get("rc") != 0:
+            continue
+
+        try:
+            result[name] = decompress(b64decode(section["out"]))
+        except (BadGzipFile, BinasciiError, EOFError, KeyError, ZlibError):
+            continue
+
+    return result
+
+
+def _make_log_bundle(
+    output: Optional[str], max_lines: int, log_state: Optional[LogState] = None
+) -> LogBundle:
+    sections = {
+        name: value.decode(errors="replace") if name != "chromium_log" else value
+        for name, value in _parse_bundle(output).items()
+    }
+    hd_size, hd_free = _parse_disk_usage(sections.get("disk_usage"))
+
+    if log_state is None:
+        chromium_log = _filter_chromium_log(
+            _decode(sections.get("chromium_log")), max_lines
+        )
+    else:
+        chromium_log = _update_chromium_log(
+            log_state, sections.get("chromium_log"), max_lines
+        )
+
+    if log_state is None:
+        error_log = _filter_error_log(sections.get("error_log"), max_lines)
+    else:
+        error_log = _update_error_log(
+            log_state, sections.get("error_log"), max_lines
+        )
+
+    return LogBundle(
+        error_log=error_log,
+        chromium_log=chromium_log,
+        smartctl_full=_parse_smartctl_full(sections.get("smartctl_full")),
+        hd_size=hd_size,
+        hd_free=hd_free,
+    )
+
+
+def _decode(output: Optional[bytes]) -> Optional[str]:
     if output is None:
         return None
+    return output.decode(errors="replace")
 
-    ignored = ("sshd", "hidslcfg", "watchdog")
-    lines = [
+
+def _chromium_log_increment_command(log_state: LogState) -> str:
+    """Print inode and size of the Chromium log, followed by the
+    bytes after the stored offset if the file was not rotated,
+    or by a bounded tail of the file otherwise.
+    """
+    inode = -1 if log_state.chromium_inode is None else log_state.chromium_inode
+    offset = log_state.chromium_offset or 0
+    return (
+        f"f={CHROMIUM_LOG_PATH}; "
+        "s=$(stat -c '%i %s' \"$f\" 2>/dev/null) || exit 1; "
+        'set -- $s; echo "$s"; '
+        f'if [ "$1" = {inode} ] && [ "$2" -ge {offset} ]; '
+        f'then tail -c +{offset + 1} "$f" | head -c $(($2 - {offset})); '
+        f'else head -c "$2" "$f" | tail -c {CHROMIUM_TAIL_BYTES}; fi'
+    )
+
+
+def _update_chromium_log(
+    log_state: LogState, output: Optional[bytes], max_lines: int
+) -> Optional[str]:
+    """Merge the fetched increment into the stored
+    Chromium log window and advance the offset.
+    """
+    if output is None:
+        return None
+
+    header, _, data = output.partition(b"\n")
+
+    try:
+        inode, size = map(int, header.split())
+    except ValueError:
+        return None
+
+    incremental = (
+        log_state.chromium_log is not None
+        and log_state.chromium_inode == inode
+        and log_state.chromium_offset is not None
+        and log_state.chromium_offset <= size
+    )
+
+    if incremental:
+        offset = log_state.chromium_offset
+        window = log_state.chromium_log + "\n"
+    else:
+        offset = size - len(data)
+        window = ""
+
+        if offset > 0:  # Drop the partial first line of the tail.
+            skip = data.find(b"\n") + 1
+            data, offset = data[skip:], offset + skip
+
+    # Leave a partial last line for the next run.
+    complete = data.rfind(b"\n") + 1
+    log_state.chromium_inode = inode
+    log_state.chromium_offset = offset + complete
+    log_state.chromium_log = _filter_chromium_log(
+        window + data[:complete].decode(errors="replace"), max_lines
+    ) or ""
+    return log_state.chromium_log or None
+
+
+def _error_log_lines(output: str) -> list[str]:
+    return [
         line.strip()
         for line in output.splitlines()
         if line.strip()
         and not line.strip().startswith("--")
-        and not any(p in line for p in ignored)
+        and not any(p in line for p in ERROR_LOG_IGNORED)
     ]
-    return "\n".join(lines[:max_lines]) or None
 
 
-def get_chromium_log(
-    system: System, *, max_lines: int = 150
+def _filter_error_log(output: Optional[str], max_lines: int) -> Optional[str]:
+    if output is None:
+        return None
+
+    return "\n".join(_error_log_lines(output)[:max_lines]) or None
+
+
+def _error_log_increment_command(log_state: LogState, since: str) -> str:
+    """Print the journal entries after the stored cursor and the new cursor.
+    If the cursor is unknown or invalid, fall back to the entries since `since`.
+    """
+    command = f"{_error_log_command(since)} --show-cursor"
+
+    if log_state.journal_cursor is None:
+        return command
+
+    return (
+        "/usr/bin/journalctl --priority=crit "
+        f"--after-cursor {quote(log_state.journal_cursor)} "
+        "--no-pager -o short-iso --show-cursor 2>/dev/null "
+        f"|| {{ echo '{JOURNAL_RESET_MARKER}'; {command}; }}"
+    )
+
+
+def _journal_timestamp(line: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(line.split(maxsplit=1)[0], "%Y-%m-%dT%H:%M:%S%z")
+    except (IndexError, ValueError):
+        return None
+
+
+def _update_error_log(
+    log_state: LogState, output: Optional[str], max_lines: int
 ) -> Optional[str]:
-    """Fetch Chromium debug log from the system via SSH."""
-    output = _run_ssh(system, f"cat {CHROMIUM_LOG_PATH} 2>/dev/null")
+    """Merge the fetched journal entries into the stored rolling
+    window of critical entries and advance the cursor.
+    If the window exceeds ERROR_LOG_MAX_BYTES, its oldest entries are dropped.
+    """
+    if output is None:
+        return None
+
+    lines = output.splitlines()
+    reset = (
+        log_state.journal_cursor is None
+        or log_state.error_log is None
+        or (lines and lines[0] == JOURNAL_RESET_MARKER)
+    )
+    window = [] if reset else log_state.error_log.splitlines()
+    window += _error_log_lines(output)
+    oldest = datetime.now().astimezone() - ERROR_LOG_WINDOW
+    window = [
+        line
+        for line in window
+        if (timestamp := _journal_timestamp(line)) is None or timestamp >= oldest
+    ]
+
+    for line in reversed(lines):
+        if line.startswith(JOURNAL_CURSOR_PREFIX):
+            log_state.journal_cursor = line[len(JOURNAL_CURSOR_PREFIX):]
+            break
+
+    window = _newest_lines(window, ERROR_LOG_MAX_BYTES)
+    log_state.error_log = "\n".join(window)
+    return "\n".join(window[:max_lines]) or None
+
+
+def _newest_lines(lines: list[str], max_bytes: int) -> list[str]:
+    """Return the newest lines that fit into max_bytes when joined."""
+    size = 0
+
+    for index in range(len(lines) - 1, -1, -1):
+        size += len(lines[index].encode()) + 1
+
+        if size > max_bytes + 1:
+            return lines[index + 1:]
+
+    return lines
+
+
+def _filter_chromium_log(output: Optional[str], max_lines: int) -> Optional[str]:
     if output is None:
         return None
 
@@ -98,17 +526,138 @@ def get_chromium_log(
     return "\n".join(lines[-max_lines:]) or None
 
 
-def get_smartctl_full(system: System) -> Optional[str]:
-    """Fetch full smartctl output as JSON from the system via SSH."""
-    output = _run_ssh(
-        system,
-        "/usr/bin/smartctl -a --json /dev/sda 2>/dev/null || /usr/bin/smartctl -a --json /dev/nvme0 2>/dev/null",
-    )
+def _parse_smartctl_full(output: Optional[str]) -> Optional[str]:
     if output is None:
         return None
     return output.strip() or None
 
 
+def _parse_disk_usage(output: Optional[str]) -> tuple:
+    if output is None:
+        return None, None
+    parts = output.strip().split()
+    if len(parts) != 2:
+        return None, None
+    try:
+        return int(parts[0]), int(parts[1])
+    except ValueError:
+        return None, None
+
+
+def get_error_log(
+    system: System, *, since: str = "4 days ago", max_lines: int = 150
+) -> Optional[str]:
+    """Fetch critical journald entries from the system via SSH."""
+    return _filter_error_log(
+        _fetch(system, _error_log_command(since), ERROR_LOG_REMOTE_FILTER),
+        max_lines,
+    )
+
+
+async def get_error_log_async(
+    system: System,
+    *,
+    since: str = "4 days ago",
+    max_lines: int = 150,
+    session: Optional[SSHSession] = None,
+) -> Optional[str]:
+    """Fetch critical journald entries from the system via asynchronous SSH."""
+    return _filter_error_log(
+        await _fetch_async(
+            system,
+            _error_log_command(since),
+            ERROR_LOG_REMOTE_FILTER,
+            session=session,
+        ),
+        max_lines,
+    )
+
+
+async def get_error_log_incremental_async(
+    system: System,
+    *,
+    log_state: LogState,
+    since: str = "4 days ago",
+    max_lines: int = 150,
+    session: Optional[SSHSession] = None,
+) -> Optional[str]:
+    """Fetch the critical journald entries that were
+    logged since the last run via asynchronous SSH.
+    The log state is updated, but not saved.
+    """
+    return _update_error_log(
+        log_state,
+        await _fetch_async(
+            system,
+            _error_log_increment_command(log_state, since),
+            ERROR_LOG_REMOTE_FILTER,
+            session=session,
+        ),
+        max_lines,
+    )
+
+
+def get_chromium_log(
+    system: System, *, max_lines: int = 150
+) -> Optional[str]:
+    """Fetch Chromium debug log from the system via SSH."""
+    return _filter_chromium_log(
+        _fetch(system, CHROMIUM_LOG_COMMAND, CHROMIUM_LOG_REMOTE_FILTER), max_lines
+    )
+
+
+async def get_chromium_log_async(
+    system: System, *, max_lines: int = 150, session: Optional[SSHSession] = None
+) -> Optional[str]:
+    """Fetch Chromium debug log from the system via asynchronous SSH."""
+    return _filter_chromium_log(
+        await _fetch_async(
+            system,
+            CHROMIUM_LOG_COMMAND,
+            CHROMIUM_LOG_REMOTE_FILTER,
+            session=session,
+        ),
+        max_lines,
+    )
+
+
+async def get_chromium_log_incremental_async(
+    system: System,
+    *,
+    log_state: LogState,
+    max_lines: int = 150,
+    session: Optional[SSHSession] = None,
+) -> Optional[str]:
+    """Fetch the Chromium debug log lines that were
+    appended since the last run via asynchronous SSH.
+    The log state is updated, but not saved.
+    """
+    return _update_chromium_log(
+        log_state,
+        await _fetch_async(
+            system,
+            _chromium_log_increment_command(log_state),
+            session=session,
+            text=False,
+        ),
+        max_lines,
+    )
+
+
+def get_smartctl_full(system: System) -> Optional[str]:
+    """Fetch full smartctl output as JSON from the system via SSH."""
+    return _parse_smartctl_full(_run_ssh(system, SMARTCTL_COMMAND))
+
+
+async def get_smartctl_full_async(
+    system: System, *, session: Optional[SSHSession] = None
+) -> Optional[str]:
+    """Fetch full smartctl output as JSON from the system via asynchronous SSH."""
+    return _parse_smartctl_full(
+        await _run_ssh_async(system, SMARTCTL_COMMAND, session=session)
+    )
+
+
 def parse_hd_uptime(smartctl_json: Optional[str]) -> Optional[int]:
     """Extract power-on hours from a smartctl JSON string."""
     if not smartctl_json:
@@ -121,13 +670,44 @@ def parse_hd_uptime(smartctl_json: Optional[str]) -> Optional[int]:
 
 def get_disk_usage(system: System) -> tuple:
     """Return (total_mb, free_mb) of the root partition via SSH, or (None, None) on failure."""
-    output = _run_ssh(system, "df -BM / | awk 'NR==2 {gsub(/M/,\"\",$2); gsub(/M/,\"\",$4); print $2, $4}'")
-    if output is None:
-        return None, None
-    parts = output.strip().split()
-    if len(parts) != 2:
-        return None, None
-    try:
-        return int(parts[0]), int(parts[1])
-    except ValueError:
-        return None, None
+    return _parse_disk_usage(_run_ssh(system, DISK_USAGE_COMMAND))
+
+
+async def get_disk_usage_async(
+    system: System, *, session: Optional[SSHSession] = None
+) -> tuple:
+    """Like get_disk_usage() but via asynchronous SSH."""
+    return _parse_disk_usage(
+        await _run_ssh_async(system, DISK_USAGE_COMMAND, session=session)
+    )
+
+
+def get_log_bundle(
+    system: System, *, since: str = "4 days ago", max_lines: int = 150
+) -> LogBundle:
+    """Fetch error log, Chromium log, smartctl output and
+    disk usage from the system in a single SSH command.
+    """
+    return _make_log_bundle(_fetch(system, _bundle_command(since)), max_lines)
+
+
+async def get_log_bundle_async(
+    system: System,
+    *,
+    since: str = "4 days ago",
+    max_lines: int = 150,
+    session: Optional[SSHSession] = None,
+    log_state: Optional[LogState] = None,
+    skip: frozenset[str] = frozenset(),
+) -> LogBundle:
+    """Like get_log_bundle() but via asynchronous SSH.
+    If a log state is given, the Chromium log is fetched incrementally.
+    The sections named in skip are not fetched.
+    """
+    return _make_log_bundle(
+        await _fetch_async(
+            system, _bundle_command(since, log_state, skip), session=session
+        ),
+        max_lines,
+        log_state,
+    )
@@ -10,14 +10,24 @@ __all__ = ["get_offline_since"]
 
 
 def get_offline_since(
-    current: CheckResults, last: Optional[CheckResults]
+    current: CheckResults, last: Optional[CheckResults], *, confirm: bool = False
 ) -> Optional[datetime]:
-    """Returns the datetime since when the check is considered offline."""
+    """Returns the datetime since when the check is considered offline.
+
+    If confirmation is required, a failure is only considered
+    offline once the following check failed as well.
+    """
 
     if current.online:
         return None
 
-    if last is None or last.offline_since is None:
+    if last is not None and last.offline_since is not None:
+        return last.offline_since
+
+    if not confirm:
         return datetime.now()
 
-    return last.offline_since
+    if last is None or last.online:
+        return None
+
+    return last.timestamp
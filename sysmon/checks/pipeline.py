@@ -0,0 +1,944 @@
+"""Asynchronous per-system check pipeline."""
+
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio import Task, create_task, gather, get_running_loop, to_thread, wait_for
+from datetime import datetime, timedelta
+from functools import partial
+from json import dumps
+from time import perf_counter
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+
+from hwdb import System
+
+from sysmon.capabilities import CACHED_PROBES, Capabilities
+from sysmon.capabilities import capability_cache_enabled, load_capabilities
+from sysmon.capabilities import record_capabilities
+from sysmon.config import LOGGER, get_config
+from sysmon.enumerations import BandwidthPolicy, SuccessFailedUnsupported
+from sysmon.latency import DEFAULT_TIMEOUTS, LATENCY_FIELDS, load_timeouts
+from sysmon.orm import CheckResults, LogState, NewestCheckResults
+
+from sysmon.checks.application import get_application_state
+from sysmon.checks.application import get_application_version
+from sysmon.checks.baytrail import get_baytrail_freeze_state
+from sysmon.checks.black_screen import get_blackscreen_since
+from sysmon.checks.common import get_application_async
+from sysmon.checks.common import get_last_check
+from sysmon.checks.common import get_sysinfo_async
+from sysmon.checks.efi import efi_mount_ok
+from sysmon.checks.icmp import check_icmp_request_async
+from sysmon.checks.iperf3 import Bandwidth, BandwidthScheduler
+from sysmon.checks.iperf3 import get_bandwidth_ttl, measure_bandwidth_async
+from sysmon.checks.logs import LogBundle
+from sysmon.checks.logs import get_chromium_log_async
+from sysmon.checks.logs import get_chromium_log_incremental_async
+from sysmon.checks.logs import get_disk_usage_async
+from sysmon.checks.logs import get_error_log_async
+from sysmon.checks.logs import get_error_log_incremental_async
+from sysmon.checks.logs import get_log_bundle_async
+from sysmon.checks.logs import get_smartctl_full_async
+from sysmon.checks.logs import parse_hd_uptime
+from sysmon.checks.meminfo import get_ram_available
+from sysmon.checks.meminfo import get_ram_free
+from sysmon.checks.meminfo import get_ram_total
+from sysmon.checks.offline import get_offline_since
+from sysmon.checks.prefetch import Prefetched
+from sysmon.checks.root_partition import check_root_not_ro
+from sysmon.checks.sensors import check_system_sensors
+from sysmon.checks.smart import get_smart_results
+from sysmon.checks.ssh import SSH_USERS, SSHSession
+from sysmon.checks.synchronization import is_in_sync
+from sysmon.checks.touchscreen import count_recent_touch_events
+from sysmon.checks.transfer import TRANSFERS, accounted, get_daily_cap
+from sysmon.checks.transfer import get_transferred_since
+
+
+__all__ = [
+    "CHECK_KINDS",
+    "LIGHT_KINDS",
+    "NOT_COLLECTED",
+    "Probe",
+    "build_check_results",
+    "create_check_async",
+    "create_check_with_deadline",
+    "get_deadline",
+    "get_newest_check",
+    "get_probes",
+    "run_probes",
+]
+
+
+DEADLINE = 300  # seconds
+FINISH_TIME = 10  # seconds to assemble and store the results after the deadline
+NOT_COLLECTED = object()
+GATED_PROBES = {
+    "ssh_login",
+    "error_log",
+    "chromium_log",
+    "smartctl_full",
+    "disk_usage",
+    "bandwidth",
+    "log_bundle",
+}
+INTERNAL_PROBES = {"reachable", "log_bundle", "log_state"}
+# Probes that are not collected instead of failing the check at its deadline,
+# since the bandwidth probe may wait long for a free iperf3 slot.
+OPTIONAL_PROBES = {"bandwidth"}
+NOT_COLLECTED_DEFAULTS = {
+    "ssh_login": SuccessFailedUnsupported.NOT_COLLECTED,
+    "disk_usage": (None, None),
+    "bandwidth": Bandwidth(),
+}
+# Probes and resulting fields of the kinds of checks that can be run separately.
+KIND_PROBES = {
+    "icmp": {"icmp_request"},
+    "sysinfo": {"sysinfo", "application_mode", "recent_touch_events"},
+    "logs": {
+        "ssh_login",
+        "error_log",
+        "chromium_log",
+        "smartctl_full",
+        "disk_usage",
+        "log_bundle",
+        "log_state",
+    },
+    "bandwidth": {"bandwidth"},
+}
+KIND_FIELDS = {
+    "icmp": {"icmp_request"},
+    "sysinfo": {
+        "http_request",
+        "application_state",
+        "smart_check",
+        "baytrail_freeze",
+        "fsck_repair",
+        "application_version",
+        "efi_mount_ok",
+        "root_not_ro",
+        "sensors",
+        "in_sync",
+        "ram_total",
+        "ram_free",
+        "ram_available",
+        "application_mode",
+        "recent_touch_events",
+    },
+    "logs": {
+        "ssh_login",
+        "error_log",
+        "chromium_log",
+        "smartctl_full",
+        "hd_uptime",
+        "hd_size",
+        "hd_free",
+    },
+    "bandwidth": {
+        "download",
+        "upload",
+        "bandwidth_queue_time",
+        "bandwidth_test_time",
+        "bandwidth_timestamp",
+    },
+}
+CHECK_KINDS = frozenset(KIND_PROBES)
+# Kinds of checks that transfer little data.
+LIGHT_KINDS = frozenset({"icmp", "sysinfo"})
+SKIPPED_DEFAULTS = {
+    "sysinfo": (SuccessFailedUnsupported.UNSUPPORTED, {}),
+    "disk_usage": (None, None),
+    "bandwidth": Bandwidth(),
+}
+
+
+def build_check_results(
+    system: System,
+    now: datetime,
+    *,
+    http_request: SuccessFailedUnsupported,
+    sysinfo: dict[str, Any],
+    **probes: Any,
+) -> CheckResults:
+    """Assemble check results from the sysinfo dict and raw probe results."""
+
+    check_results = CheckResults(
+        system=system,
+        http_request=http_request,
+        application_state=get_application_state(sysinfo),
+        smart_check=get_smart_results(sysinfo),
+        baytrail_freeze=get_baytrail_freeze_state(sysinfo),
+        fsck_repair=sysinfo.get("cmdline", {}).get("fsck.repair"),
+        application_version=get_application_version(sysinfo),
+        efi_mount_ok=efi_mount_ok(sysinfo),
+        root_not_ro=check_root_not_ro(sysinfo),
+        sensors=check_system_sensors(sysinfo),
+        hd_uptime=parse_hd_uptime(probes.get("smartctl_full")),
+        **probes,
+    )
+
+    if system.ddb_os:
+        check_results.in_sync = is_in_sync(system, now)
+    else:
+        check_results.ram_total = get_ram_total(sysinfo)
+        check_results.ram_free = get_ram_free(sysinfo)
+        check_results.ram_available = get_ram_available(sysinfo)
+
+    return check_results
+
+
+class Probe(NamedTuple):
+    """A node of the per-system probe dependency graph.
+
+    The function is called with the results of the probes named
+    in `requires` as keyword arguments. Probes named in `after`
+    are merely awaited before the function is called.
+    """
+
+    function: Callable[..., Awaitable[Any]]
+    requires: tuple[str, ...] = ()
+    after: tuple[str, ...] = ()
+
+
+async def run_probes(probes: dict[str, Probe]) -> dict[str, Any]:
+    """Run all probes concurrently, each as soon as
+    the probes it depends on have completed.
+    """
+
+    tasks: dict[str, Task] = {}
+
+    async def run_probe(name: str) -> Any:
+        probe = probes[name]
+        results = await gather(*(schedule(dep) for dep in probe.requires))
+        await gather(*(schedule(dep) for dep in probe.after))
+        return await probe.function(**dict(zip(probe.requires, results)))
+
+    def schedule(name: str) -> Task:
+        if (task := tasks.get(name)) is None:
+            task = tasks[name] = create_task(run_probe(name))
+
+        return task
+
+    for name in probes:
+        schedule(name)
+
+    try:
+        return dict(zip(tasks, await gather(*tasks.values())))
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+
+        raise
+
+
+def log_bundle_enabled() -> bool:
+    """Determine whether SSH probes shall be bundled into one command."""
+
+    return get_config().getboolean("logs", "bundle", fallback=False)
+
+
+def incremental_logs_enabled() -> bool:
+    """Determine whether logs shall be fetched incrementally."""
+
+    return get_config().getboolean("logs", "incremental", fallback=False)
+
+
+def confirm_offline_enabled() -> bool:
+    """Determine whether failures need to be confirmed
+    by a recheck before a system is considered offline.
+    """
+
+    return get_config().getboolean("collector", "confirm_offline", fallback=False)
+
+
+def get_deadline() -> float:
+    """Return the configured wall-clock deadline of a check in seconds."""
+
+    return get_config().getfloat("collector", "deadline", fallback=DEADLINE)
+
+
+def reachability_gate_enabled() -> bool:
+    """Determine whether the reachability gate is enabled."""
+
+    return get_config().getboolean(
+        "collector", "reachability_gate", fallback=False
+    )
+
+
+async def is_reachable(
+    *,
+    icmp_request: bool,
+    sysinfo: tuple[SuccessFailedUnsupported, dict[str, Any]],
+    last_check: Optional[CheckResults] = None,
+    kinds: frozenset[str] = CHECK_KINDS,
+) -> bool:
+    """Determine whether the system answered to either ICMP or HTTP.
+    The results of the kinds of checks that are not run are
+    taken from the last check.
+    """
+
+    http_request, _ = sysinfo
+
+    if last_check is not None:
+        if "icmp" not in kinds:
+            icmp_request = last_check.icmp_request
+
+        if "sysinfo" not in kinds:
+            http_request = last_check.http_request
+
+    return icmp_request or http_request is SuccessFailedUnsupported.SUCCESS
+
+
+def gated(function: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """Skip the probe unless the system is reachable."""
+
+    async def wrapper(*, reachable: bool, **kwargs) -> Any:
+        if not reachable:
+            return NOT_COLLECTED
+
+        return await function(**kwargs)
+
+    return wrapper
+
+
+def add_reachability_gate(
+    probes: dict[str, Probe], kinds: frozenset[str] = CHECK_KINDS
+) -> dict[str, Probe]:
+    """Make the expensive SSH and iperf3 probes
+    depend on the system being reachable.
+    """
+
+    probes["reachable"] = Probe(
+        partial(is_reachable, kinds=kinds),
+        requires=("icmp_request", "sysinfo", "last_check"),
+    )
+
+    for name in GATED_PROBES & probes.keys():
+        function, requires, after = probes[name]
+        probes[name] = Probe(gated(function), requires + ("reachable",), after)
+
+    return probes
+
+
+async def from_log_bundle(name: str, *, log_bundle: LogBundle) -> Any:
+    """Return a field of the log bundle as probe result."""
+
+    if name == "disk_usage":
+        return log_bundle.hd_size, log_bundle.hd_free
+
+    return getattr(log_bundle, name)
+
+
+def add_log_bundle(
+    probes: dict[str, Probe],
+    system: System,
+    session: SSHSession,
+    skip: frozenset[str] = frozenset(),
+) -> dict[str, Probe]:
+    """Replace the separate SSH log probes by one bundled probe."""
+
+    probes["log_bundle"] = Probe(
+        partial(get_log_bundle_async, system, session=session, skip=skip),
+        requires=("log_state",) if "log_state" in probes else (),
+        after=("ssh_login",),
+    )
+
+    for name in ("error_log", "chromium_log", "smartctl_full", "disk_usage"):
+        probes[name] = Probe(partial(from_log_bundle, name), requires=("log_bundle",))
+
+    return probes
+
+
+def add_incremental_logs(
+    probes: dict[str, Probe], system: System, session: SSHSession
+) -> dict[str, Probe]:
+    """Fetch only the journal entries and Chromium
+    log lines that were added since the last run.
+    """
+
+    probes["log_state"] = Probe(partial(to_thread, LogState.for_system, system))
+    probes["error_log"] = Probe(
+        partial(get_error_log_incremental_async, system, session=session),
+        requires=("log_state",),
+        after=("ssh_login",),
+    )
+    probes["chromium_log"] = Probe(
+        partial(get_chromium_log_incremental_async, system, session=session),
+        requires=("log_state",),
+        after=("ssh_login",),
+    )
+    return probes
+
+
+async def skipped(value: Any = None) -> Any:
+    """Placeholder for a probe that is not run."""
+
+    return value
+
+
+def skip_probes(probes: dict[str, Probe], kinds: frozenset[str]) -> dict[str, Probe]:
+    """Replace the probes of all kinds of checks that shall not be run."""
+
+    for kind in CHECK_KINDS - kinds:
+        for name in KIND_PROBES[kind] & probes.keys():
+            probes[name] = Probe(partial(skipped, SKIPPED_DEFAULTS.get(name)))
+
+    return probes
+
+
+def skip_unsupported(
+    probes: dict[str, Probe], unsupported: frozenset[str]
+) -> dict[str, Probe]:
+    """Replace the probes that the system is known not to support."""
+
+    for name in unsupported & probes.keys():
+        probes[name] = Probe(partial(skipped, SKIPPED_DEFAULTS.get(name)))
+
+    return probes
+
+
+def get_kind_probes(kinds: frozenset[str]) -> frozenset[str]:
+    """Return the names of the probes of the given kinds of checks."""
+
+    return frozenset().union(*(KIND_PROBES[kind] for kind in kinds))
+
+
+def get_capability_failures(
+    results: dict[str, Any], probes: frozenset[str]
+) -> dict[str, bool]:
+    """Return whether the cached probes that ran failed.
+    Failures are only conclusive if the system ran SSH commands.
+    """
+
+    if results["ssh_login"] is not SuccessFailedUnsupported.SUCCESS:
+        return {}
+
+    if results["disk_usage"] == (None, None):
+        return {}
+
+    http_request, _ = results["sysinfo"]
+    failed = {
+        "sysinfo": http_request is SuccessFailedUnsupported.UNSUPPORTED,
+        "smartctl_full": results["smartctl_full"] is None,
+    }
+    return {probe: failed[probe] for probe in CACHED_PROBES & probes}
+
+
+async def update_capabilities(
+    system: System,
+    capabilities: Capabilities,
+    ssh_user: Optional[str],
+    failures: dict[str, bool],
+) -> None:
+    """Stores changes of the system's capabilities."""
+
+    store, delete = capabilities.update(ssh_user, failures)
+
+    if not store and not delete:
+        return
+
+    for name, value in store.items():
+        LOGGER.info("Caching %s of system %i: %s", name, system.id, value)
+
+    await to_thread(record_capabilities, system.id, store, delete)
+
+
+def carry_over(
+    check_results: CheckResults,
+    last_check: Optional[CheckResults],
+    kinds: frozenset[str],
+) -> CheckResults:
+    """Copy the fields of the kinds of checks that
+    were not run from the last check.
+    A failed SSH login is not copied, so that the online
+    state only depends on the probes that were run.
+    """
+
+    if last_check is None:
+        return check_results
+
+    for kind in CHECK_KINDS - kinds:
+        for field in KIND_FIELDS[kind]:
+            setattr(check_results, field, getattr(last_check, field))
+
+    if (
+        "logs" not in kinds
+        and check_results.ssh_login is SuccessFailedUnsupported.FAILED
+    ):
+        check_results.ssh_login = SuccessFailedUnsupported.NOT_COLLECTED
+        check_results.not_collected = ",".join(
+            sorted({*check_results.not_collected_probes, "ssh_login"})
+        )
+
+    return check_results
+
+
+def get_last_check_or_none(system: System) -> Optional[CheckResults]:
+    """Returns the last check of the given system, if any."""
+
+    try:
+        return get_last_check(system)
+    except CheckResults.DoesNotExist:
+        return None
+
+
+def get_newest_check(system: int) -> Optional[NewestCheckResults]:
+    """Returns the newest check of the given system, if any."""
+
+    try:
+        return NewestCheckResults.get(NewestCheckResults.system == system)
+    except NewestCheckResults.DoesNotExist:
+        return None
+
+
+async def get_prefetched_last_check(
+    prefetched: Prefetched, system: System
+) -> Optional[CheckResults]:
+    """Returns the prefetched last check of the given system."""
+
+    return prefetched.get_last_check(system.id)
+
+
+async def get_prefetched_touch_events(
+    prefetched: Prefetched, system: System
+) -> Optional[int]:
+    """Returns the prefetched recent touch events of the given system."""
+
+    return prefetched.get_recent_touch_events(system.deployment_id)
+
+
+async def get_bandwidth(
+    system: System,
+    now: datetime,
+    policy: BandwidthPolicy,
+    *,
+    last_check: Optional[CheckResults],
+    site_check: Optional[CheckResults] = None,
+    scheduler: Optional[BandwidthScheduler] = None,
+    timeout: int = DEFAULT_TIMEOUTS["bandwidth"],
+) -> Bandwidth:
+    """Return download and upload in kbps according to the policy.
+    Measurements are queued by the bandwidth scheduler.
+    With the cached policy, systems that share their site with a
+    representative take over the representative's last measurement,
+    if it succeeded and is still valid.
+    """
+
+    if policy is BandwidthPolicy.SKIP:
+        return Bandwidth()
+
+    if policy is BandwidthPolicy.REUSE:
+        return get_cached_bandwidth(last_check)
+
+    ttl = get_bandwidth_ttl(system)
+
+    if is_cached(last_check, now, ttl):
+        LOGGER.info("Use Bandwidth check from last check for System: %i", system.id)
+        return get_cached_bandwidth(last_check)
+
+    if (
+        is_cached(site_check, now, ttl)
+        and site_check.download is not None
+        and site_check.upload is not None
+    ):
+        LOGGER.info(
+            "Use Bandwidth check of site representative %i for System: %i",
+            site_check.system_id,
+            system.id,
+        )
+        return get_cached_bandwidth(site_check)
+
+    LOGGER.info("New Bandwidth check for System: %i", system.id)
+    return await measure_bandwidth_async(system, scheduler=scheduler, timeout=timeout)
+
+
+def get_cached_bandwidth(last_check: Optional[CheckResults]) -> Bandwidth:
+    """Return the bandwidth stored in the given check."""
+
+    if last_check is None:
+        return Bandwidth()
+
+    return Bandwidth(
+        last_check.download,
+        last_check.upload,
+        timestamp=last_check.bandwidth_timestamp,
+    )
+
+
+def is_cached(
+    last_check: Optional[CheckResults], now: datetime, ttl: timedelta
+) -> bool:
+    """Determine whether the last check contains a bandwidth
+    measurement that is still valid.
+    """
+
+    return (
+        last_check is not None
+        and last_check.bandwidth_timestamp is not None
+        and now - last_check.bandwidth_timestamp < ttl
+    )
+
+
+def get_probes(
+    system: System,
+    now: datetime,
+    bandwidth: BandwidthPolicy,
+    session: SSHSession,
+    *,
+    gate: bool = False,
+    bundle: bool = False,
+    incremental: bool = False,
+    prefetched: Optional[Prefetched] = None,
+    timeouts: dict[str, int] = DEFAULT_TIMEOUTS,
+    unsupported: frozenset[str] = frozenset(),
+    kinds: frozenset[str] = CHECK_KINDS,
+) -> dict[str, Probe]:
+    """Return the probe dependency graph of the given system.
+    All SSH probes share the session, which is opened by the SSH login probe.
+    Probes that the system is known not to support are skipped.
+    """
+
+    probes = {
+        "sysinfo": Probe(
+            partial(get_sysinfo_async, system, timeout=timeouts["sysinfo"])
+        ),
+        "icmp_request": Probe(
+            partial(check_icmp_request_async, system, timeout=timeouts["icmp_request"])
+        ),
+        "ssh_login": Probe(session.open),
+        "error_log": Probe(
+            partial(get_error_log_async, system, session=session),
+            after=("ssh_login",),
+        ),
+        "chromium_log": Probe(
+            partial(get_chromium_log_async, system, session=session),
+            after=("ssh_login",),
+        ),
+        "smartctl_full": Probe(
+            partial(get_smartctl_full_async, system, session=session),
+            after=("ssh_login",),
+        ),
+        "disk_usage": Probe(
+            partial(get_disk_usage_async, system, session=session),
+            after=("ssh_login",),
+        ),
+        "application_mode": Probe(partial(get_application_async, system)),
+        "recent_touch_events": Probe(
+            partial(to_thread, count_recent_touch_events, system.deployment, now)
+            if prefetched is None
+            else partial(get_prefetched_touch_events, prefetched, system)
+        ),
+        "last_check": Probe(
+            partial(to_thread, get_last_check_or_none, system)
+            if prefetched is None
+            else partial(get_prefetched_last_check, prefetched, system)
+        ),
+        # Do not let log transfers skew the bandwidth measurement.
+        "bandwidth": Probe(
+            partial(
+                get_bandwidth,
+                system,
+                now,
+                bandwidth,
+                site_check=(
+                    None if prefetched is None else prefetched.get_site_check(system.id)
+                ),
+                timeout=timeouts["bandwidth"],
+            ),
+            requires=("last_check",),
+            after=("error_log", "chromium_log", "smartctl_full"),
+        ),
+    }
+
+    if incremental:
+        probes = add_incremental_logs(probes, system, session)
+
+    if bundle:
+        probes = add_log_bundle(probes, system, session, unsupported)
+
+    probes = skip_unsupported(probes, unsupported)
+
+    if gate:
+        return add_reachability_gate(probes, kinds)
+
+    return probes
+
+
+def succeeded(result: Any) -> bool:
+    """Determine whether the result of a timed probe is a success."""
+
+    if isinstance(result, tuple):
+        result, _ = result
+
+    return result is True or result is SuccessFailedUnsupported.SUCCESS
+
+
+def timed(
+    function: Callable[..., Awaitable[Any]], name: str, latencies: dict[str, float]
+) -> Callable[..., Awaitable[Any]]:
+    """Store the time the probe took in the latencies if it succeeded.
+    Failed probes took as long as their timeout, so that their
+    times would drive the learned timeouts to their maximum.
+    """
+
+    async def wrapper(**kwargs) -> Any:
+        start = perf_counter()
+        result = await function(**kwargs)
+
+        if succeeded(result):
+            latencies[name] = perf_counter() - start
+
+        return result
+
+    return wrapper
+
+
+def add_timing(
+    probes: dict[str, Probe], latencies: dict[str, float]
+) -> dict[str, Probe]:
+    """Time the probes whose timeouts are learned from their latencies."""
+
+    for name in (LATENCY_FIELDS.keys() - {"bandwidth"}) & probes.keys():
+        function, requires, after = probes[name]
+        probes[name] = Probe(timed(function, name, latencies), requires, after)
+
+    return probes
+
+
+def add_accounting(probes: dict[str, Probe]) -> dict[str, Probe]:
+    """Account the bytes that the probes transfer to their names."""
+
+    return {
+        name: Probe(accounted(function, name), requires, after)
+        for name, (function, requires, after) in probes.items()
+    }
+
+
+def bounded(
+    function: Callable[..., Awaitable[Any]], name: str, until: float
+) -> Callable[..., Awaitable[Any]]:
+    """Cancel the probe at the given event loop time."""
+
+    async def wrapper(**kwargs) -> Any:
+        try:
+            return await wait_for(
+                function(**kwargs), max(0, until - get_running_loop().time())
+            )
+        except AsyncTimeoutError:
+            if name not in OPTIONAL_PROBES:
+                raise
+
+            LOGGER.warning("Probe %s exceeded the deadline.", name)
+            return NOT_COLLECTED
+
+    return wrapper
+
+
+def add_deadline(probes: dict[str, Probe], until: float) -> dict[str, Probe]:
+    """Limit the probes to the deadline at the given event loop time."""
+
+    return {
+        name: Probe(bounded(function, name, until), requires, after)
+        for name, (function, requires, after) in probes.items()
+    }
+
+
+def get_transfer_fields(transfers: dict[str, list[int]]) -> dict[str, Any]:
+    """Return the transfer fields of the check results."""
+
+    return {
+        "bytes_sent": sum(sent for sent, _ in transfers.values()),
+        "bytes_received": sum(received for _, received in transfers.values()),
+        "transfer": dumps(transfers) if transfers else None,
+    }
+
+
+async def is_capped(system: System, prefetched: Optional[Prefetched]) -> bool:
+    """Determine whether the system used up its daily transfer cap."""
+
+    if (cap := get_daily_cap(system)) is None:
+        return False
+
+    if prefetched is None:
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        transferred = (
+            await to_thread(get_transferred_since, today, system.id)
+        ).get(system.id, 0)
+    else:
+        transferred = prefetched.get_transferred(system.id)
+
+    return transferred >= cap
+
+
+def get_latencies(
+    results: dict[str, Any], latencies: dict[str, float]
+) -> dict[str, Optional[float]]:
+    """Return the latency fields of the probes that succeeded."""
+
+    bandwidth = results["bandwidth"]
+    fields = {
+        field: latencies.get(name)
+        for name, field in LATENCY_FIELDS.items()
+        if name != "bandwidth"
+    }
+    # Only measurements of this check have a test time.
+    fields[LATENCY_FIELDS["bandwidth"]] = (
+        bandwidth.test_time / 2
+        if bandwidth.test_time is not None
+        and bandwidth.download is not None
+        and bandwidth.upload is not None
+        else None
+    )
+    return fields
+
+
+async def create_check_async(
+    system: System,
+    *,
+    bandwidth: BandwidthPolicy = BandwidthPolicy.CACHED,
+    now: Optional[datetime] = None,
+    gate: Optional[bool] = None,
+    bundle: Optional[bool] = None,
+    incremental: Optional[bool] = None,
+    prefetched: Optional[Prefetched] = None,
+    kinds: frozenset[str] = CHECK_KINDS,
+    last_check: Optional[CheckResults] = None,
+    deadline: Optional[float] = None,
+) -> CheckResults:
+    """Check the given system, running independent probes concurrently.
+
+    Only the given kinds of checks are run. The fields
+    of the others are copied from the last check.
+    """
+
+    started = perf_counter()
+    until = None if deadline is None else get_running_loop().time() + deadline
+    now = now or datetime.now()
+    gate = reachability_gate_enabled() if gate is None else gate
+    bundle = log_bundle_enabled() if bundle is None else bundle
+    incremental = incremental_logs_enabled() if incremental is None else incremental
+    timeouts = (
+        await to_thread(load_timeouts, system.id)
+        if prefetched is None
+        else prefetched.get_timeouts(system.id)
+    )
+    capabilities = (
+        await to_thread(load_capabilities, system.id)
+        if prefetched is None
+        else prefetched.get_capabilities(system.id)
+    )
+    latencies = {}
+    transfers = {}
+    TRANSFERS.set(transfers)
+
+    if kinds - LIGHT_KINDS and await is_capped(system, prefetched):
+        LOGGER.info("System %i used up its daily transfer cap.", system.id)
+        kinds &= LIGHT_KINDS
+
+    if last_check is None and kinds != CHECK_KINDS:
+        if (last_check := await to_thread(get_newest_check, system.id)) is None:
+            kinds = CHECK_KINDS
+
+    unsupported = capabilities.unsupported & get_kind_probes(kinds)
+
+    async with SSHSession(
+        system,
+        timeout=timeouts["ssh_login"],
+        users=capabilities.get_ssh_users(SSH_USERS),
+    ) as session:
+        probes = get_probes(
+            system,
+            now,
+            bandwidth,
+            session,
+            gate=gate,
+            bundle=bundle,
+            incremental=incremental,
+            prefetched=prefetched,
+            timeouts=timeouts,
+            unsupported=unsupported,
+            kinds=kinds,
+        )
+
+        if last_check is not None:
+            probes["last_check"] = Probe(partial(skipped, last_check))
+
+        probes = skip_probes(add_accounting(add_timing(probes, latencies)), kinds)
+
+        if until is not None:
+            probes = add_deadline(probes, until)
+
+        results = await run_probes(probes)
+        ssh_user = session.user
+
+    if capability_cache_enabled():
+        await update_capabilities(
+            system,
+            capabilities,
+            ssh_user,
+            get_capability_failures(
+                results, get_kind_probes(kinds) - unsupported
+            ),
+        )
+
+    if (log_state := results.get("log_state")) is not None:
+        await to_thread(log_state.save)
+
+    not_collected = sorted(
+        name
+        for name, result in results.items()
+        if result is NOT_COLLECTED and name not in INTERNAL_PROBES
+    )
+
+    for name in not_collected:
+        results[name] = NOT_COLLECTED_DEFAULTS.get(name)
+
+    http_request, sysinfo = results["sysinfo"]
+    hd_size, hd_free = results["disk_usage"]
+    bandwidth = results["bandwidth"]
+    check_results = build_check_results(
+        system,
+        now,
+        http_request=http_request,
+        sysinfo=sysinfo,
+        icmp_request=results["icmp_request"],
+        ssh_login=results["ssh_login"],
+        download=bandwidth.download,
+        upload=bandwidth.upload,
+        bandwidth_queue_time=bandwidth.queue_time,
+        bandwidth_test_time=bandwidth.test_time,
+        bandwidth_timestamp=bandwidth.timestamp,
+        recent_touch_events=results["recent_touch_events"],
+        application_mode=results["application_mode"],
+        error_log=results["error_log"],
+        chromium_log=results["chromium_log"],
+        smartctl_full=results["smartctl_full"],
+        hd_size=hd_size,
+        hd_free=hd_free,
+        not_collected=",".join(sorted({*not_collected, *unsupported})) or None,
+        **get_latencies(results, latencies),
+        **get_transfer_fields(transfers),
+    )
+    last_check = results["last_check"]
+    carry_over(check_results, last_check, kinds)
+    check_results.offline_since = get_offline_since(
+        check_results, last_check, confirm=confirm_offline_enabled()
+    )
+    check_results.blackscreen_since = get_blackscreen_since(check_results, last_check)
+    check_results.duration = perf_counter() - started
+    return check_results
+
+
+async def create_check_with_deadline(
+    system: System, *, deadline: Optional[float] = None, **kwargs
+) -> CheckResults:
+    """Check the given system within the deadline.
+    If the deadline is exceeded, the running probes are
+    cancelled and asyncio.TimeoutError is raised.
+    A bandwidth probe that exceeds the deadline,
+    e.g. waiting for an iperf3 slot, is not collected instead.
+    """
+
+    deadline = get_deadline() if deadline is None else deadline
+    return await wait_for(
+        create_check_async(system, deadline=deadline, **kwargs),
+        deadline + FINISH_TIME,
+    )
@@ -0,0 +1,176 @@
+"""Data prefetched once per collection run."""
+
+from __future__ import annotations
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Iterable, NamedTuple, Optional, TypeVar
+
+from hwdb import System
+
+from sysmon.capabilities import Capabilities, capability_cache_enabled
+from sysmon.capabilities import get_capabilities
+from sysmon.config import get_config
+from sysmon.latency import DEFAULT_TIMEOUTS, adaptive_timeouts_enabled, get_timeouts
+from sysmon.orm import CheckResults, NewestCheckResults
+
+from sysmon.checks.touchscreen import count_recent_touch_events_by_deployment
+from sysmon.checks.transfer import daily_caps_enabled, get_transferred_since
+
+
+__all__ = ["Prefetched", "prefetch", "with_prefetched"]
+
+
+T = TypeVar("T")
+
+
+class Prefetched(NamedTuple):
+    """Data of all systems that is loaded at the start of a collection run.
+    Systems missing in the maps have no respective data.
+    """
+
+    last_checks: dict[int, CheckResults]
+    touch_events: dict[int, int]
+    site_representatives: dict[int, int] = {}
+    timeouts: dict[int, dict[str, int]] = {}
+    transferred: dict[int, int] = {}
+    capabilities: dict[int, Capabilities] = {}
+
+    def get_last_check(self, system: int) -> Optional[CheckResults]:
+        """Returns the last check of the given system, if any."""
+        return self.last_checks.get(system)
+
+    def get_recent_touch_events(self, deployment: Optional[int]) -> Optional[int]:
+        """Returns the amount of recent touch events of the given deployment."""
+        if deployment is None:
+            return None
+
+        return self.touch_events.get(deployment, 0)
+
+    def get_site_check(self, system: int) -> Optional[CheckResults]:
+        """Returns the last check of the system's site representative,
+        if the system shares its site with a representative.
+        """
+        if (representative := self.site_representatives.get(system)) is None:
+            return None
+
+        return self.get_last_check(representative)
+
+    def get_timeouts(self, system: int) -> dict[str, int]:
+        """Returns the timeouts of the probes of the given system."""
+        return {**DEFAULT_TIMEOUTS, **self.timeouts.get(system, {})}
+
+    def get_transferred(self, system: int) -> int:
+        """Returns the bytes that the checks of the given system transferred today."""
+        return self.transferred.get(system, 0)
+
+    def get_capabilities(self, system: int) -> Capabilities:
+        """Returns the cached capabilities of the given system."""
+        return self.capabilities.get(system, Capabilities())
+
+    def subset(self, system: System) -> Prefetched:
+        """Returns the prefetched data of a single system."""
+        touch_events = self.touch_events.get(system.deployment_id)
+        representative = self.site_representatives.get(system.id)
+        return type(self)(
+            last_checks={
+                system_id: last_check
+                for system_id in (system.id, representative)
+                if (last_check := self.get_last_check(system_id)) is not None
+            },
+            touch_events=(
+                {} if touch_events is None else {system.deployment_id: touch_events}
+            ),
+            site_representatives=(
+                {} if representative is None else {system.id: representative}
+            ),
+            timeouts=(
+                {system.id: self.timeouts[system.id]}
+                if system.id in self.timeouts
+                else {}
+            ),
+            transferred=(
+                {system.id: self.transferred[system.id]}
+                if system.id in self.transferred
+                else {}
+            ),
+            capabilities=(
+                {system.id: self.capabilities[system.id]}
+                if system.id in self.capabilities
+                else {}
+            ),
+        )
+
+
+def site_grouping_enabled() -> bool:
+    """Determine whether bandwidth shall be measured once per site."""
+
+    return get_config().getboolean("bandwidth", "group_sites", fallback=False)
+
+
+def get_site_representatives(systems: Iterable[System]) -> dict[int, int]:
+    """Groups the systems by the address of their deployment and maps
+    each system to the representative of its site, i.e. the system
+    with the lowest ID. Representatives and single systems are omitted.
+    """
+
+    sites = defaultdict(list)
+
+    for system in systems:
+        if system.deployment is not None and system.deployment.address_id is not None:
+            sites[system.deployment.address_id].append(system.id)
+
+    return {
+        system: min(site)
+        for site in sites.values()
+        for system in site
+        if system != min(site)
+    }
+
+
+def get_last_checks() -> dict[int, CheckResults]:
+    """Returns the last check of each system by system ID."""
+
+    return {
+        check.system_id: check
+        for check in NewestCheckResults.select(
+            NewestCheckResults.system,
+            NewestCheckResults.timestamp,
+            NewestCheckResults.icmp_request,
+            NewestCheckResults.ssh_login,
+            NewestCheckResults.offline_since,
+            NewestCheckResults.blackscreen_since,
+            NewestCheckResults.download,
+            NewestCheckResults.upload,
+            NewestCheckResults.bandwidth_timestamp,
+        )
+    }
+
+
+def prefetch(
+    systems: Iterable[System] = (), now: Optional[datetime] = None
+) -> Prefetched:
+    """Loads the data for a collection run of the given systems."""
+
+    now = now or datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return Prefetched(
+        last_checks=get_last_checks(),
+        touch_events=count_recent_touch_events_by_deployment(now),
+        site_representatives=(
+            get_site_representatives(systems) if site_grouping_enabled() else {}
+        ),
+        timeouts=get_timeouts() if adaptive_timeouts_enabled() else {},
+        transferred=get_transferred_since(today) if daily_caps_enabled() else {},
+        capabilities=get_capabilities(now=now) if capability_cache_enabled() else {},
+    )
+
+
+def with_prefetched(
+    check_function: Callable[..., T], item: tuple[System, Prefetched], **kwargs
+) -> T:
+    """Calls the check function on the system with its prefetched data.
+    This allows pool workers to only receive the data of their system.
+    """
+
+    system, prefetched = item
+    return check_function(system, prefetched=prefetched, **kwargs)
@@ -0,0 +1,146 @@
+"""Confirmation of failures of systems that just went offline."""
+
+from __future__ import annotations
+from asyncio import Semaphore, Task, create_task, gather, new_event_loop, sleep
+from asyncio import run_coroutine_threadsafe, to_thread
+from datetime import datetime
+from threading import Thread
+from typing import Optional, Union
+
+from hwdb import System
+
+from sysmon.checks.pipeline import create_check_with_deadline
+from sysmon.checks.prefetch import Prefetched
+from sysmon.concurrency import AdaptiveSemaphore
+from sysmon.config import LOGGER, get_config
+from sysmon.orm import CheckResults
+from sysmon.writer import CheckWriter
+
+
+__all__ = ["RECHECK_KINDS", "RecheckQueue", "RecheckThread", "needs_recheck"]
+
+
+RECHECK_CONCURRENCY = 50
+RECHECK_DELAY = 120  # seconds
+RECHECK_KINDS = frozenset({"icmp", "sysinfo"})
+
+
+def get_recheck_delay() -> float:
+    """Return the configured delay of rechecks in seconds."""
+
+    return get_config().getfloat(
+        "collector", "recheck_delay", fallback=RECHECK_DELAY
+    )
+
+
+def get_recheck_concurrency() -> int:
+    """Return the configured amount of concurrent rechecks
+    if no semaphore is shared with the collector.
+    """
+
+    return get_config().getint(
+        "collector", "recheck_concurrency", fallback=RECHECK_CONCURRENCY
+    )
+
+
+def needs_recheck(check_results: CheckResults) -> bool:
+    """Determine whether the check found a failure that is not yet
+    confirmed and that a recheck can confirm, i.e. a failed ICMP request.
+    Failed SSH logins are confirmed by the next check that runs SSH.
+    """
+
+    return (
+        not check_results.online
+        and check_results.offline_since is None
+        and not check_results.icmp_request
+    )
+
+
+class RecheckQueue:
+    """Re-probes systems with ICMP and HTTP only, a delay after their
+    checks failed, in order to confirm that they went offline.
+    """
+
+    def __init__(
+        self,
+        writer: CheckWriter,
+        prefetched: Optional[Prefetched] = None,
+        *,
+        delay: Optional[float] = None,
+        semaphore: Optional[Union[Semaphore, AdaptiveSemaphore]] = None,
+    ):
+        self.writer = writer
+        self.prefetched = prefetched or Prefetched(last_checks={}, touch_events={})
+        self.delay = get_recheck_delay() if delay is None else delay
+        self.semaphore = semaphore or Semaphore(get_recheck_concurrency())
+        self.tasks: set[Task] = set()
+
+    def put(self, system: System, check_results: CheckResults) -> None:
+        """Schedules a recheck of the system whose check failed."""
+        task = create_task(self.recheck(system, check_results))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def join(self) -> None:
+        """Waits for all scheduled rechecks to finish."""
+        while self.tasks:
+            await gather(*self.tasks)
+
+    async def recheck(self, system: System, failed: CheckResults) -> None:
+        """Rechecks the system and stores the results.
+        The failed check serves as last check, so that
+        a repeated failure confirms the offline state.
+        """
+        elapsed = (datetime.now() - failed.timestamp).total_seconds()
+        await sleep(max(0, self.delay - elapsed))
+
+        async with self.semaphore:
+            LOGGER.info("Rechecking system: %i", system.id)
+
+            try:
+                check_results = await create_check_with_deadline(
+                    system,
+                    kinds=RECHECK_KINDS,
+                    prefetched=self.prefetched.subset(system),
+                    last_check=failed,
+                )
+                await to_thread(self.writer.put, check_results)
+            except Exception:
+                LOGGER.exception("Exception in recheck, system: %i", system.id)
+
+
+class RecheckThread:
+    """Runs a recheck queue in an event loop of its own,
+    so that synchronous collectors can recheck systems
+    while the results of other systems still come in.
+    """
+
+    def __init__(self, writer: CheckWriter, prefetched: Optional[Prefetched] = None):
+        self.writer = writer
+        self.prefetched = prefetched
+        self.loop = new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.rechecks: Optional[RecheckQueue] = None
+
+    def __enter__(self) -> RecheckThread:
+        self.thread.start()
+        self.rechecks = run_coroutine_threadsafe(
+            self.create_queue(), self.loop
+        ).result()
+        return self
+
+    def __exit__(self, *_) -> None:
+        try:
+            run_coroutine_threadsafe(self.rechecks.join(), self.loop).result()
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+
+    async def create_queue(self) -> RecheckQueue:
+        """Creates the recheck queue within the thread's event loop."""
+        return RecheckQueue(self.writer, self.prefetched)
+
+    def put(self, system: System, check_results: CheckResults) -> None:
+        """Schedules a recheck of the system whose check failed."""
+        self.loop.call_soon_threadsafe(self.rechecks.put, system, check_results)
@@ -0,0 +1,228 @@
+"""Execution of checks in worker processes with a hard deadline per system."""
+
+from __future__ import annotations
+from asyncio import TimeoutError as AsyncTimeoutError
+from collections import deque
+from functools import partial
+from multiprocessing import Pool
+from queue import Empty, Queue
+from time import monotonic
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from hwdb import System
+
+from sysmon.concurrency import ConcurrencyController
+from sysmon.config import LOGGER, get_config
+from sysmon.orm import CheckResults
+
+from sysmon.checks.lanes import Lanes
+from sysmon.checks.pipeline import CHECK_KINDS, get_deadline
+from sysmon.checks.prefetch import Prefetched
+
+
+__all__ = ["DeadlinePool"]
+
+
+PROCESSES = 6
+GRACE = 30  # seconds
+
+
+def get_grace() -> float:
+    """Return the configured time in seconds that a worker may take
+    beyond the deadline to cancel its check before it is abandoned.
+    """
+
+    return get_config().getfloat("collector", "grace", fallback=GRACE)
+
+
+class DeadlinePool:
+    """Streams check results from a process pool in order of completion.
+
+    Workers cancel checks that exceed the deadline. Checks that do not
+    return within the grace period thereafter are abandoned and their
+    workers are considered stuck. Once all workers are stuck, the pool
+    is terminated and replaced. If checks are pending, but none can be
+    submitted although workers are idle, e.g. due to a limit of zero,
+    RuntimeError is raised. The IDs of all systems whose checks
+    timed out are collected in `timed_out`.
+    With a concurrency controller, the pool is sized to the controller's
+    maximum and the amount of running checks follows its limit.
+    With lanes, systems of the respective connection types are checked
+    by additional workers, limited by and passing the kinds of checks
+    to run according to their lane.
+    """
+
+    def __init__(
+        self,
+        function: Callable[[tuple[System, Prefetched]], Optional[CheckResults]],
+        *,
+        processes: int = PROCESSES,
+        deadline: Optional[float] = None,
+        grace: Optional[float] = None,
+        controller: Optional[ConcurrencyController] = None,
+        lanes: Optional[Lanes] = None,
+    ):
+        self.function = function
+        self.controller = controller
+        self.lanes = lanes
+        self.width = processes if controller is None else controller.maximum
+        self.processes = self.width + (
+            0 if lanes is None else sum(lanes.limits.values())
+        )
+        self.deadline = get_deadline() if deadline is None else deadline
+        self.grace = get_grace() if grace is None else grace
+        self.results: Queue[tuple[int, int, Any, Optional[BaseException]]] = Queue()
+        self.pool: Optional[Pool] = None
+        self.generation = 0
+        self.running: dict[int, float] = {}
+        self.submitted: dict[int, tuple[System, frozenset[str]]] = {}
+        self.stuck: set[int] = set()
+        self.timed_out: list[int] = []
+
+    def __enter__(self) -> DeadlinePool:
+        self.pool = Pool(processes=self.processes)
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.pool.terminate()
+        self.pool.join()
+
+    @property
+    def busy(self) -> int:
+        """Returns the amount of busy workers."""
+        return len(self.running) + len(self.stuck)
+
+    def get_lane(self, system: System) -> Optional[str]:
+        """Returns the lane of the system or None for the wide lane."""
+        if self.lanes is None:
+            return None
+
+        return self.lanes.get_lane(system)
+
+    def get_limit(self, lane: Optional[str]) -> int:
+        """Returns the amount of checks to run simultaneously in the lane."""
+        if lane is not None:
+            return self.lanes.limits[lane]
+
+        if self.controller is None:
+            return self.width
+
+        return self.controller.limit
+
+    def imap_unordered(
+        self, items: Iterable[tuple[System, Prefetched]]
+    ) -> Iterator[CheckResults]:
+        """Yields the check results of the systems as they complete."""
+        pending = {None: deque()}
+
+        for system, prefetched in items:
+            pending.setdefault(self.get_lane(system), deque()).append(
+                (system, prefetched)
+            )
+
+        while any(pending.values()) or self.running:
+            for lane, queue in pending.items():
+                while (
+                    queue
+                    and self.busy < self.processes
+                    and self.count_running(lane) < self.get_limit(lane)
+                ):
+                    self.submit(*queue.popleft())
+
+            if not self.running:
+                if self.busy < self.processes:
+                    raise RuntimeError("Pending checks cannot be submitted.")
+
+                self.restart()
+                continue
+
+            timeout = min(self.running.values()) + self.deadline + self.grace
+
+            try:
+                generation, system, result, error = self.results.get(
+                    timeout=max(0, timeout - monotonic())
+                )
+            except Empty:
+                self.abandon_overdue()
+                continue
+
+            if generation != self.generation:
+                continue
+
+            if system in self.stuck:
+                self.stuck.discard(system)
+                continue
+
+            del self.running[system]
+            system, _ = self.submitted.pop(system)
+
+            if isinstance(error, AsyncTimeoutError):
+                self.timeout(system.id)
+            elif error is not None:
+                LOGGER.error("Check of system %i failed: %s", system.id, error)
+            elif result is not None:
+                if self.controller is not None:
+                    self.controller.complete(result)
+
+                if self.lanes is not None:
+                    self.lanes.record(system, result)
+
+                yield result
+
+    def count_running(self, lane: Optional[str]) -> int:
+        """Returns the amount of running checks in the lane."""
+        return sum(
+            self.get_lane(system) == lane
+            for system, _ in (self.submitted[ident] for ident in self.running)
+        )
+
+    def submit(self, system: System, prefetched: Prefetched) -> None:
+        """Starts checking the system in a worker."""
+        kinds = CHECK_KINDS if self.lanes is None else self.lanes.get_kinds(system)
+        self.running[system.id] = monotonic()
+        self.submitted[system.id] = (system, kinds)
+        self.pool.apply_async(
+            self.function,
+            ((system, prefetched),),
+            {} if kinds == CHECK_KINDS else {"kinds": kinds},
+            callback=partial(self.complete, self.generation, system.id),
+            error_callback=partial(self.complete, self.generation, system.id, None),
+        )
+
+    def complete(
+        self,
+        generation: int,
+        system: int,
+        result: Optional[CheckResults],
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Hands a result over from the pool's result handler thread."""
+        self.results.put((generation, system, result, error))
+
+    def abandon_overdue(self) -> None:
+        """Abandons the checks that exceeded deadline and grace period."""
+        now = monotonic()
+
+        for system, started in list(self.running.items()):
+            if now - started >= self.deadline + self.grace:
+                LOGGER.warning("Abandoning stuck check of system: %i", system)
+                del self.running[system]
+                del self.submitted[system]
+                self.stuck.add(system)
+                self.timeout(system)
+
+    def timeout(self, system: int) -> None:
+        """Records that the check of the system timed out."""
+        self.timed_out.append(system)
+
+        if self.controller is not None:
+            self.controller.timeout()
+
+    def restart(self) -> None:
+        """Replaces the pool whose workers are all stuck."""
+        LOGGER.warning("Terminating pool with %i stuck workers.", len(self.stuck))
+        self.pool.terminate()
+        self.pool.join()
+        self.pool = Pool(processes=self.processes)
+        self.generation += 1
+        self.stuck.clear()
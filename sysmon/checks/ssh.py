@@ -1,30 +1,152 @@
 """SSH checks."""
 
+from __future__ import annotations
+from os.path import exists, join
+from shutil import rmtree
 from subprocess import PIPE
 from subprocess import TimeoutExpired
 from subprocess import CalledProcessError
 from subprocess import run
+from tempfile import mkdtemp
+from typing import Optional, Sequence, Union
 
 from hwdb import OperatingSystem, System
 
+from sysmon.checks.common import run_async
 from sysmon.config import get_config
 from sysmon.enumerations import SuccessFailedUnsupported
 
 
-__all__ = ["check_ssh"]
+__all__ = ["SSHSession", "check_ssh", "check_ssh_async"]
 
 
-SSH_USERS = {"root", "homeinfo"}
+SSH_USERS = ("root", "homeinfo")
 SSH_CAPABLE_OSS = {OperatingSystem.ARCH_LINUX, OperatingSystem.ARCH_LINUX_ARM}
+CONTROL_PERSIST = 60  # seconds
+
+
+class SSHSession:
+    """A multiplexed SSH connection to a system.
+
+    The first successful login starts a ControlMaster, over
+    which all subsequent commands are run without another
+    TCP connection or key exchange. The master terminates
+    on close() or after being idle for CONTROL_PERSIST seconds.
+    The SSH users are tried in the given order.
+    """
+
+    def __init__(
+        self,
+        system: System,
+        *,
+        timeout: int = 10,
+        users: Sequence[str] = SSH_USERS,
+    ):
+        self.system = system
+        self.timeout = timeout
+        self.users = users
+        self.user: Optional[str] = None
+        self.directory: Optional[str] = None
+
+    async def __aenter__(self) -> SSHSession:
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self.close()
+
+    @property
+    def control_path(self) -> Optional[str]:
+        """Return the path of the control socket."""
+        if self.directory is None:
+            return None
+
+        return join(self.directory, "control")
+
+    def get_command(self, user: str, *args: str) -> list[str]:
+        """Return an SSH command using the control socket."""
+        return [
+            "/usr/bin/ssh",
+            *get_ssh_options(timeout=self.timeout),
+            "-o",
+            f"ControlPath={self.control_path}",
+            *args,
+            f"{user}@{self.system.ip_address}",
+        ]
+
+    async def open(self) -> SuccessFailedUnsupported:
+        """Start the master connection, trying all SSH users."""
+        if self.system.operating_system not in SSH_CAPABLE_OSS:
+            return SuccessFailedUnsupported.UNSUPPORTED
+
+        self.directory = mkdtemp(prefix="sysmon-ssh-")
+
+        for user in self.users:
+            try:
+                await run_async(
+                    self.get_command(
+                        user,
+                        "-o",
+                        "ControlMaster=yes",
+                        "-o",
+                        f"ControlPersist={CONTROL_PERSIST}",
+                        "-f",
+                        "-N",
+                    ),
+                    timeout=self.timeout + 1,
+                    capture=False,
+                )
+            except (CalledProcessError, TimeoutExpired):
+                continue
+
+            self.user = user
+            return SuccessFailedUnsupported.SUCCESS
 
+        return SuccessFailedUnsupported.FAILED
 
-def check_ssh(system: System, timeout: int) -> SuccessFailedUnsupported:
-    """Checks the SSH connection to the system."""
+    async def run(
+        self, remote_cmd: str, *, timeout: int, text: bool = True
+    ) -> Optional[Union[str, bytes]]:
+        """Run a command over the master connection.
+        Return stdout or None on failure.
+        """
+        if self.user is None:
+            return None
+
+        try:
+            return await run_async(
+                self.get_command(self.user, "-o", "ControlMaster=no") + [remote_cmd],
+                timeout=timeout,
+                text=text,
+            )
+        except (CalledProcessError, TimeoutExpired):
+            return None
+
+    async def close(self) -> None:
+        """Terminate the master connection."""
+        if self.user is not None and exists(self.control_path):
+            try:
+                await run_async(
+                    self.get_command(self.user, "-O", "exit"), timeout=self.timeout
+                )
+            except (CalledProcessError, TimeoutExpired):
+                pass
+
+        self.user = None
+
+        if self.directory is not None:
+            rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+
+def check_ssh(
+    system: System, timeout: int, *, users: Sequence[str] = SSH_USERS
+) -> SuccessFailedUnsupported:
+    """Checks the SSH connection to the system, trying the users in order."""
 
     if system.operating_system not in SSH_CAPABLE_OSS:
         return SuccessFailedUnsupported.UNSUPPORTED
 
-    for user in SSH_USERS:
+    for user in users:
         if (
             check_ssh_login(system, user, timeout=timeout)
             is SuccessFailedUnsupported.SUCCESS
@@ -34,6 +156,24 @@ def check_ssh(system: System, timeout: int) -> SuccessFailedUnsupported:
     return SuccessFailedUnsupported.FAILED
 
 
+async def check_ssh_async(
+    system: System, timeout: int, *, users: Sequence[str] = SSH_USERS
+) -> SuccessFailedUnsupported:
+    """Checks the SSH connection to the system asynchronously."""
+
+    if system.operating_system not in SSH_CAPABLE_OSS:
+        return SuccessFailedUnsupported.UNSUPPORTED
+
+    for user in users:
+        if (
+            await check_ssh_login_async(system, user, timeout=timeout)
+            is SuccessFailedUnsupported.SUCCESS
+        ):
+            return SuccessFailedUnsupported.SUCCESS
+
+    return SuccessFailedUnsupported.FAILED
+
+
 def check_ssh_login(
     system: System, user: str, *, timeout: int = 5
 ) -> SuccessFailedUnsupported:
@@ -56,11 +196,36 @@ def check_ssh_login(
     return SuccessFailedUnsupported.SUCCESS
 
 
+async def check_ssh_login_async(
+    system: System, user: str, *, timeout: int = 5
+) -> SuccessFailedUnsupported:
+    """Checks the SSH login on the system asynchronously."""
+
+    try:
+        await run_async(
+            get_ssh_command(system, user=user, timeout=timeout), timeout=timeout + 1
+        )
+    except (CalledProcessError, TimeoutExpired):
+        return SuccessFailedUnsupported.FAILED
+
+    return SuccessFailedUnsupported.SUCCESS
+
+
 def get_ssh_command(system: System, *, user: str, timeout: int = 5) -> list[str]:
     """Return a list of SSH command and parameters for subprocess.run()."""
 
     return [
         "/usr/bin/ssh",
+        *get_ssh_options(timeout=timeout),
+        f"{user}@{system.ip_address}",
+        "/usr/bin/true",
+    ]
+
+
+def get_ssh_options(*, timeout: int = 5) -> list[str]:
+    """Return the common SSH command line options."""
+
+    return [
         "-i",
         get_config().get("ssh", "keyfile"),
         "-o",
@@ -71,6 +236,4 @@ def get_ssh_command(system: System, *, user: str, timeout: int = 5) -> list[str]
         "StrictHostKeyChecking=no",
         "-o",
         f"ConnectTimeout={timeout}",
-        f"{user}@{system.ip_address}",
-        "/usr/bin/true",
     ]
@@ -3,11 +3,13 @@
 from datetime import datetime, timedelta
 from typing import Optional, Union
 
+from peewee import fn
+
 from digsigdb import Statistics
 from hwdb import Deployment
 
 
-__all__ = ["count_recent_touch_events"]
+__all__ = ["count_recent_touch_events", "count_recent_touch_events_by_deployment"]
 
 
 RECENT_TOUCH_EVENTS = timedelta(days=21)
@@ -33,3 +35,20 @@ def count_recent_touch_events(
         )
         .count()
     )
+
+
+def count_recent_touch_events_by_deployment(
+    start: datetime, *, span: timedelta = RECENT_TOUCH_EVENTS
+) -> dict[int, int]:
+    """Count recent touch events of all deployments in one query.
+    Deployments without recent touch events are omitted.
+    """
+
+    return dict(
+        Statistics.select(Statistics.deployment, fn.COUNT(Statistics.id))
+        .where(
+            (Statistics.timestamp >= start - span) & (Statistics.timestamp <= start)
+        )
+        .group_by(Statistics.deployment)
+        .tuples()
+    )
@@ -0,0 +1,120 @@
+"""Accounting of the bytes transferred by the probes of a check."""
+
+from __future__ import annotations
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional
+
+from peewee import fn
+
+from hwdb import System
+
+from sysmon.config import get_config
+from sysmon.orm import CheckResults
+
+
+__all__ = [
+    "TRANSFERS",
+    "accounted",
+    "count_transfer",
+    "daily_caps_enabled",
+    "get_connection",
+    "get_daily_cap",
+    "get_transferred_since",
+]
+
+
+MIB = 1024 * 1024
+# Bytes sent and received per probe of the running check.
+TRANSFERS: ContextVar[Optional[dict[str, list[int]]]] = ContextVar(
+    "transfers", default=None
+)
+PROBE: ContextVar[Optional[str]] = ContextVar("probe", default=None)
+
+
+def count_transfer(sent: int = 0, received: int = 0) -> None:
+    """Adds the bytes sent to and received from the
+    system to the running probe of the running check.
+    """
+
+    if (transfers := TRANSFERS.get()) is None:
+        return
+
+    counts = transfers.setdefault(PROBE.get() or "other", [0, 0])
+    counts[0] += sent
+    counts[1] += received
+
+
+def accounted(
+    function: Callable[..., Awaitable[Any]], name: str
+) -> Callable[..., Awaitable[Any]]:
+    """Account the transfers of the probe to its name."""
+
+    async def wrapper(**kwargs) -> Any:
+        PROBE.set(name)
+        return await function(**kwargs)
+
+    return wrapper
+
+
+def get_connection(system: System) -> Optional[str]:
+    """Returns the lower-case name of the system's connection type, if any."""
+
+    try:
+        return system.deployment.connection.name.lower()
+    except AttributeError:
+        return None
+
+
+def daily_caps_enabled() -> bool:
+    """Determine whether any daily transfer cap is configured."""
+
+    config = get_config()
+
+    if not config.has_section("transfer"):
+        return False
+
+    return any(key.startswith("daily_cap") for key in config.options("transfer"))
+
+
+def get_daily_cap(system: System) -> Optional[int]:
+    """Return the daily transfer cap of the system in bytes, if any.
+    The cap is configured in MiB as "daily_cap", per connection
+    type, e.g. "daily_cap_lte", and per system, e.g. "daily_cap_123".
+    """
+
+    config = get_config()
+    cap = config.getfloat("transfer", "daily_cap", fallback=None)
+
+    if (connection := get_connection(system)) is not None:
+        cap = config.getfloat("transfer", f"daily_cap_{connection}", fallback=cap)
+
+    cap = config.getfloat("transfer", f"daily_cap_{system.id}", fallback=cap)
+    return None if cap is None else round(cap * MIB)
+
+
+def get_transferred_since(
+    start: datetime, system: Optional[int] = None
+) -> dict[int, int]:
+    """Returns the bytes that the checks of all or the
+    given system transferred since the given datetime.
+    """
+
+    condition = CheckResults.timestamp >= start
+
+    if system is not None:
+        condition &= CheckResults.system == system
+
+    return {
+        system: int(transferred)
+        for system, transferred in CheckResults.select(
+            CheckResults.system,
+            fn.SUM(
+                fn.COALESCE(CheckResults.bytes_sent, 0)
+                + fn.COALESCE(CheckResults.bytes_received, 0)
+            ),
+        )
+        .where(condition)
+        .group_by(CheckResults.system)
+        .tuples()
+    }
@@ -0,0 +1,136 @@
+"""Asynchronous collection engine."""
+
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio import Semaphore, gather, run, to_thread
+from typing import Iterable, Optional, Union
+
+from hwdb import System
+
+from sysmon.checks.lanes import Lanes, lanes_enabled
+from sysmon.checks.pipeline import CHECK_KINDS, create_check_with_deadline
+from sysmon.checks.pipeline import get_deadline
+from sysmon.checks.prefetch import Prefetched, prefetch
+from sysmon.checks.recheck import RecheckQueue, needs_recheck
+from sysmon.concurrency import AdaptiveSemaphore, ConcurrencyController
+from sysmon.concurrency import adaptive_concurrency_enabled
+from sysmon.config import LOGGER, get_config
+from sysmon.orm import CheckTimeout
+from sysmon.planner import plan
+from sysmon.writer import CheckWriter
+
+
+__all__ = ["collect", "check_systems_async"]
+
+
+CONCURRENCY = 200
+
+
+def get_concurrency() -> int:
+    """Return the configured amount of systems to check simultaneously."""
+
+    return get_config().getint("collector", "concurrency", fallback=CONCURRENCY)
+
+
+def collect(systems: Iterable[System], *, concurrency: Optional[int] = None) -> None:
+    """Checks the given systems using asynchronous I/O."""
+
+    run(check_systems_async(systems, concurrency=concurrency or get_concurrency()))
+
+
+async def check_systems_async(
+    systems: Iterable[System], *, concurrency: int = CONCURRENCY
+) -> None:
+    """Checks the given systems with at most `concurrency`
+    systems at a time and stores the results in batches.
+    """
+
+    controller = (
+        ConcurrencyController.from_config(concurrency)
+        if adaptive_concurrency_enabled()
+        else None
+    )
+    semaphore = (
+        Semaphore(concurrency) if controller is None else AdaptiveSemaphore(controller)
+    )
+    lanes = Lanes.from_config() if lanes_enabled() else None
+    semaphores = {
+        None: semaphore,
+        **{
+            lane: Semaphore(limit)
+            for lane, limit in (lanes.limits.items() if lanes else ())
+        },
+    }
+    timed_out = []
+    systems = await to_thread(plan, systems)
+    prefetched = await to_thread(prefetch, systems)
+    LOGGER.info("Checking systems with a concurrency of %i.", concurrency)
+
+    with CheckWriter(controller=controller) as writer:
+        rechecks = RecheckQueue(writer, prefetched, semaphore=semaphore)
+        await gather(
+            *(
+                check_system_async(
+                    system,
+                    semaphores[lanes.get_lane(system) if lanes else None],
+                    writer,
+                    prefetched,
+                    rechecks,
+                    timed_out,
+                    controller,
+                    lanes,
+                )
+                for system in systems
+            )
+        )
+        await rechecks.join()
+
+    if controller is not None:
+        LOGGER.info("Final concurrency: %i", controller.limit)
+
+    if timed_out:
+        LOGGER.warning("Checks of systems timed out: %s", sorted(timed_out))
+        await to_thread(CheckTimeout.record, timed_out, get_deadline())
+
+
+async def check_system_async(
+    system: System,
+    semaphore: Union[Semaphore, AdaptiveSemaphore],
+    writer: CheckWriter,
+    prefetched: Optional[Prefetched] = None,
+    rechecks: Optional[RecheckQueue] = None,
+    timed_out: Optional[list[int]] = None,
+    controller: Optional[ConcurrencyController] = None,
+    lanes: Optional[Lanes] = None,
+) -> None:
+    """Checks the given system and hands the results to the writer.
+    Systems that just went offline are queued for a recheck.
+    """
+
+    async with semaphore:
+        LOGGER.info("Checking system: %i", system.id)
+        kinds = CHECK_KINDS if lanes is None else lanes.get_kinds(system)
+
+        try:
+            system_check = await create_check_with_deadline(
+                system, prefetched=prefetched, kinds=kinds
+            )
+            await to_thread(writer.put, system_check)
+
+            if lanes is not None:
+                lanes.record(system, system_check)
+
+            if controller is not None:
+                controller.complete(system_check)
+
+            if rechecks is not None and needs_recheck(system_check):
+                rechecks.put(system, system_check)
+        except AsyncTimeoutError:
+            LOGGER.warning("Check of system %i exceeded its deadline.", system.id)
+
+            if timed_out is not None:
+                timed_out.append(system.id)
+
+            if controller is not None:
+                controller.timeout()
+        except Exception:
+            LOGGER.exception("Exception in check_system_async, system: %i", system.id)
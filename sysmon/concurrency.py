@@ -0,0 +1,211 @@
+"""Auto-tuning of the amount of systems checked simultaneously."""
+
+from __future__ import annotations
+from asyncio import Condition
+from collections import deque
+from os import cpu_count, getloadavg
+from threading import Lock
+from time import monotonic
+from typing import Optional
+
+from sysmon.config import LOGGER, get_config
+from sysmon.enumerations import SuccessFailedUnsupported
+from sysmon.orm import CheckResults
+
+
+__all__ = [
+    "AdaptiveSemaphore",
+    "ConcurrencyController",
+    "adaptive_concurrency_enabled",
+    "iperf3_failed",
+]
+
+
+MINIMUM = 1
+MAX_FACTOR = 4
+INCREASE = 1
+DECREASE = 0.5
+MAX_LOAD = 2  # per CPU
+COOLDOWN = 30  # seconds
+SAMPLES = 20  # recent iperf3 measurements
+MAX_FAILURE_RATE = 0.5
+MAX_WRITE_TIME = 10  # seconds per batch
+
+
+def adaptive_concurrency_enabled() -> bool:
+    """Determine whether the concurrency is tuned automatically."""
+
+    return get_config().getboolean("concurrency", "adaptive", fallback=False)
+
+
+def iperf3_failed(check_results: CheckResults) -> Optional[bool]:
+    """Determine whether the iperf3 measurement of a reachable system
+    failed. Returns None if the check did not measure the system.
+    """
+
+    if not (
+        check_results.icmp_request
+        and check_results.ssh_login is SuccessFailedUnsupported.SUCCESS
+        and check_results.bandwidth_test_time is not None
+    ):
+        return None
+
+    return check_results.download is None or check_results.upload is None
+
+
+class ConcurrencyController:
+    """Adjusts the concurrency with additive increase and
+    multiplicative decrease (AIMD).
+
+    Each cleanly completed check increases the limit by `increase`
+    per limit's worth of checks. The limit is decreased by the factor
+    `decrease` on timeouts, on a server load above `max_load` per CPU,
+    on database errors or writes slower than `max_write_time`, and if
+    more than `max_failure_rate` of the last `samples` iperf3
+    measurements failed, as failures of single systems are mostly
+    caused by the systems themselves. The limit is decreased at most
+    once per cooldown, so that one congestion is only responded to once.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        *,
+        minimum: int = MINIMUM,
+        maximum: Optional[int] = None,
+        increase: float = INCREASE,
+        decrease: float = DECREASE,
+        max_load: float = MAX_LOAD,
+        cooldown: float = COOLDOWN,
+        samples: int = SAMPLES,
+        max_failure_rate: float = MAX_FAILURE_RATE,
+        max_write_time: float = MAX_WRITE_TIME,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum or initial * MAX_FACTOR
+        self.window = float(min(max(initial, minimum), self.maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.max_load = max_load
+        self.cooldown = cooldown
+        self.iperf3_failures: deque[bool] = deque(maxlen=samples)
+        self.max_failure_rate = max_failure_rate
+        self.max_write_time = max_write_time
+        self.decreased = float("-inf")
+        self.lock = Lock()
+
+    @classmethod
+    def from_config(cls, initial: int) -> ConcurrencyController:
+        """Creates a controller from the configuration file."""
+        config = get_config()
+        return cls(
+            initial,
+            minimum=config.getint("concurrency", "minimum", fallback=MINIMUM),
+            maximum=config.getint(
+                "concurrency", "maximum", fallback=initial * MAX_FACTOR
+            ),
+            increase=config.getfloat("concurrency", "increase", fallback=INCREASE),
+            decrease=config.getfloat("concurrency", "decrease", fallback=DECREASE),
+            max_load=config.getfloat("concurrency", "max_load", fallback=MAX_LOAD),
+            cooldown=config.getfloat("concurrency", "cooldown", fallback=COOLDOWN),
+            samples=config.getint("concurrency", "samples", fallback=SAMPLES),
+            max_failure_rate=config.getfloat(
+                "concurrency", "max_failure_rate", fallback=MAX_FAILURE_RATE
+            ),
+            max_write_time=config.getfloat(
+                "concurrency", "max_write_time", fallback=MAX_WRITE_TIME
+            ),
+        )
+
+    @property
+    def limit(self) -> int:
+        """Returns the current amount of systems to check simultaneously."""
+        return int(self.window)
+
+    @property
+    def overloaded(self) -> bool:
+        """Determine whether the load of this server is too high."""
+        return getloadavg()[0] / (cpu_count() or 1) > self.max_load
+
+    @property
+    def congested(self) -> bool:
+        """Determine whether too many recent iperf3 measurements failed."""
+        return (
+            len(self.iperf3_failures) == self.iperf3_failures.maxlen
+            and sum(self.iperf3_failures) / len(self.iperf3_failures)
+            > self.max_failure_rate
+        )
+
+    def success(self) -> None:
+        """Records a cleanly completed check."""
+        if self.overloaded:
+            return self.backoff("server load")
+
+        with self.lock:
+            self.adjust(min(self.window + self.increase / self.window, self.maximum))
+
+    def timeout(self) -> None:
+        """Records a check that timed out."""
+        self.backoff("timeout")
+
+    def complete(self, check_results: CheckResults) -> None:
+        """Records a completed check, whose iperf3 measurement may
+        have failed along with those of many other systems.
+        """
+        if (failed := iperf3_failed(check_results)) is not None:
+            self.iperf3_failures.append(failed)
+
+        if self.congested:
+            self.iperf3_failures.clear()
+            return self.backoff("iperf3 failures")
+
+        self.success()
+
+    def written(self, duration: float) -> None:
+        """Records the time it took to write a batch of check results."""
+        if duration > self.max_write_time:
+            self.backoff("slow database writes")
+
+    def write_failed(self) -> None:
+        """Records a batch of check results that could not be written."""
+        self.backoff("database error")
+
+    def backoff(self, reason: str) -> None:
+        """Decreases the limit unless it was decreased recently."""
+        with self.lock:
+            if (now := monotonic()) - self.decreased < self.cooldown:
+                return
+
+            self.decreased = now
+            LOGGER.info("Backing off due to %s.", reason)
+            self.adjust(max(self.window * self.decrease, self.minimum))
+
+    def adjust(self, window: float) -> None:
+        """Sets the window and reports changes of the limit."""
+        limit, self.window = self.limit, window
+
+        if self.limit != limit:
+            LOGGER.info("Concurrency: %i -> %i", limit, self.limit)
+
+
+class AdaptiveSemaphore:
+    """An asyncio semaphore whose capacity follows the controller's limit."""
+
+    def __init__(self, controller: ConcurrencyController):
+        self.controller = controller
+        self.condition = Condition()
+        self.active = 0
+
+    async def __aenter__(self) -> AdaptiveSemaphore:
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: self.active < self.controller.limit
+            )
+            self.active += 1
+
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
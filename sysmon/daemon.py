@@ -1,28 +1,71 @@
 """Monitoring daemon."""
 
+from argparse import ArgumentParser, Namespace
 from datetime import date
 from logging import INFO, basicConfig
 
+from peewee import ModelSelect
+
 from hwdb import System
 
 from sysmon.blacklist import load_blacklist
 from sysmon.checks import check_systems_bw_once_a_day
-from sysmon.config import LOG_FORMAT
+from sysmon.collector import collect
+from sysmon.config import LOG_FORMAT, get_config
 from sysmon.offline_history import update_offline_systems
+from sysmon.scheduler import schedule
 
 
 __all__ = ["spawn"]
 
 
+ENGINES = {"pool", "asyncio", "scheduler"}
+
+
+def get_args() -> Namespace:
+    """Parses the CLI arguments."""
+
+    parser = ArgumentParser(description="checks the digital signage systems")
+    parser.add_argument(
+        "-e",
+        "--engine",
+        choices=sorted(ENGINES),
+        default=get_config().get("collector", "engine", fallback="pool"),
+        help="collection engine to use",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        help="amount of systems to check simultaneously (not for the pool engine)",
+    )
+    return parser.parse_args()
+
+
+def get_systems() -> ModelSelect:
+    """Selects the systems to check."""
+
+    return System.select(cascade=True).where(
+        (System.deployment is not None)
+        & (System.isvirtual == 0)
+        & (System.deployment > 0)
+    )
+
+
 def spawn() -> None:
     """Runs the daemon."""
 
+    args = get_args()
     basicConfig(level=INFO, format=LOG_FORMAT)
-    check_systems_bw_once_a_day(
-        System.select(cascade=True).where(
-            (System.deployment is not None)
-            & (System.isvirtual == 0)
-            & (System.deployment > 0)
-        )
-    )
+
+    if args.engine == "scheduler":
+        return schedule(get_systems, concurrency=args.concurrency)
+
+    systems = get_systems()
+
+    if args.engine == "asyncio":
+        collect(systems, concurrency=args.concurrency)
+    else:
+        check_systems_bw_once_a_day(systems)
+
     update_offline_systems(date.today(), blacklist=load_blacklist())
@@ -3,7 +3,12 @@
 from enum import Enum
 
 
-__all__ = ["ApplicationState", "BaytrailFreezeState", "SuccessFailedUnsupported"]
+__all__ = [
+    "ApplicationState",
+    "BandwidthPolicy",
+    "BaytrailFreezeState",
+    "SuccessFailedUnsupported",
+]
 
 
 class ApplicationState(str, Enum):
@@ -32,3 +37,12 @@ class SuccessFailedUnsupported(str, Enum):
     SUCCESS = "success"
     FAILED = "failed"
     UNSUPPORTED = "unsupported"
+    NOT_COLLECTED = "not collected"
+
+
+class BandwidthPolicy(str, Enum):
+    """How to obtain the bandwidth of a system during a check."""
+
+    CACHED = "cached"  # Measure unless the last measurement is within its TTL.
+    REUSE = "reuse"  # Reuse the last measurement regardless of its age.
+    SKIP = "skip"
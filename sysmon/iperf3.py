@@ -6,8 +6,20 @@ from json import loads
 from subprocess import DEVNULL, PIPE, run
 from typing import Any, Optional, Union
 
+__all__ = ["get_iperf3_command", "iperf3"]
 
-__all__ = ["iperf3"]
+
+def get_iperf3_command(
+    host: Union[IPv4Address, IPv6Address, str], *, reverse: bool = False
+) -> list[str]:
+    """Return the iperf3 client command."""
+
+    command = ["/usr/bin/iperf3", "-c", str(host), "-J"]
+
+    if reverse:
+        command.append("-R")
+
+    return command
 
 
 def iperf3(
@@ -18,13 +30,13 @@ def iperf3(
 ) -> dict[str, Any]:
     """Return the transmission speed."""
 
-    command = ["/usr/bin/iperf3", "-c", str(host), "-J"]
-
-    if reverse:
-        command.append("-R")
-
     return loads(
         run(
-            command, check=True, stdout=PIPE, stderr=DEVNULL, text=True, timeout=timeout
+            get_iperf3_command(host, reverse=reverse),
+            check=True,
+            stdout=PIPE,
+            stderr=DEVNULL,
+            text=True,
+            timeout=timeout,
         ).stdout
     )
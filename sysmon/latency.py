@@ -0,0 +1,170 @@
+"""Adaptive per-system probe timeouts learned from historical latencies."""
+
+from __future__ import annotations
+from datetime import datetime
+from json import dumps, loads
+from math import ceil
+from typing import Any, Iterable, Optional, Sequence
+
+from sysmon.config import get_config
+from sysmon.orm import CheckResults, ProbeLatency
+
+
+__all__ = [
+    "DEFAULT_TIMEOUTS",
+    "LATENCY_FIELDS",
+    "adaptive_timeouts_enabled",
+    "get_latency_stats",
+    "get_timeout",
+    "get_timeouts",
+    "load_timeouts",
+    "record_latencies",
+]
+
+
+# Timeouts in seconds used until enough latencies of a system are known.
+DEFAULT_TIMEOUTS = {"icmp_request": 5, "sysinfo": 15, "ssh_login": 10, "bandwidth": 15}
+# Lower and upper bounds of the learned timeouts in seconds.
+TIMEOUT_BOUNDS = {
+    "icmp_request": (3, 15),  # ping sends three requests a second apart
+    "sysinfo": (2, 45),
+    "ssh_login": (3, 30),
+    "bandwidth": (5, 45),
+}
+LATENCY_FIELDS = {
+    "icmp_request": "icmp_latency",
+    "sysinfo": "sysinfo_latency",
+    "ssh_login": "ssh_latency",
+    "bandwidth": "iperf_latency",
+}
+QUANTILE = 0.99
+FACTOR = 2
+SAMPLES = 100
+MIN_SAMPLES = 10
+
+
+def adaptive_timeouts_enabled() -> bool:
+    """Determine whether probes use the learned timeouts."""
+
+    return get_config().getboolean("timeouts", "adaptive", fallback=False)
+
+
+def quantile(samples: Sequence[float], q: float) -> float:
+    """Return the nearest-rank quantile of the samples."""
+
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, max(0, ceil(q * len(samples)) - 1))]
+
+
+def get_timeout(probe: str, samples: Sequence[float]) -> int:
+    """Return the timeout of the probe in seconds
+    derived from a system's latency samples.
+    """
+
+    config = get_config()
+
+    if len(samples) < config.getint("timeouts", "min_samples", fallback=MIN_SAMPLES):
+        return DEFAULT_TIMEOUTS[probe]
+
+    low, high = TIMEOUT_BOUNDS[probe]
+    timeout = quantile(
+        samples, config.getfloat("timeouts", "quantile", fallback=QUANTILE)
+    ) * config.getfloat("timeouts", "factor", fallback=FACTOR)
+    return ceil(
+        min(
+            max(timeout, config.getfloat("timeouts", f"{probe}_min", fallback=low)),
+            config.getfloat("timeouts", f"{probe}_max", fallback=high),
+        )
+    )
+
+
+def get_timeouts(system: Optional[int] = None) -> dict[int, dict[str, int]]:
+    """Returns the learned timeouts of all or the given system by system ID."""
+
+    select = ProbeLatency.select(
+        ProbeLatency.system, ProbeLatency.probe, ProbeLatency.timeout
+    )
+
+    if system is not None:
+        select = select.where(ProbeLatency.system == system)
+
+    timeouts = {}
+
+    for probe_latency in select:
+        timeouts.setdefault(probe_latency.system_id, {})[
+            probe_latency.probe
+        ] = probe_latency.timeout
+
+    return timeouts
+
+
+def load_timeouts(system: int) -> dict[str, int]:
+    """Returns the timeouts to use for the probes of the given system."""
+
+    if not adaptive_timeouts_enabled():
+        return DEFAULT_TIMEOUTS
+
+    return {**DEFAULT_TIMEOUTS, **get_timeouts(system).get(system, {})}
+
+
+def get_latency_stats(system: int) -> dict[str, Any]:
+    """Returns the latency statistics and timeouts of the given system."""
+
+    probes = {
+        probe: {"timeout": timeout, "default": timeout, "samples": 0}
+        for probe, timeout in DEFAULT_TIMEOUTS.items()
+    }
+
+    for probe_latency in ProbeLatency.select().where(ProbeLatency.system == system):
+        samples = loads(probe_latency.samples)
+        probes[probe_latency.probe].update(
+            timeout=probe_latency.timeout,
+            samples=len(samples),
+            median=quantile(samples, 0.5),
+            p99=quantile(samples, QUANTILE),
+            updated=probe_latency.timestamp.isoformat(),
+        )
+
+    return {"adaptive": adaptive_timeouts_enabled(), "probes": probes}
+
+
+def record_latencies(check_results: Iterable[CheckResults]) -> None:
+    """Adds the latencies of the checks to the samples of the
+    respective systems and updates their learned timeouts.
+    """
+
+    new = {}
+
+    for check in check_results:
+        for probe, field in LATENCY_FIELDS.items():
+            if (latency := getattr(check, field)) is not None:
+                new.setdefault((check.system_id, probe), []).append(round(latency, 3))
+
+    if not new:
+        return
+
+    samples = {
+        (probe_latency.system_id, probe_latency.probe): loads(probe_latency.samples)
+        for probe_latency in ProbeLatency.select().where(
+            ProbeLatency.system << {system for system, _ in new}
+        )
+    }
+    size = get_config().getint("timeouts", "samples", fallback=SAMPLES)
+    now = datetime.now()
+    rows = []
+
+    for (system, probe), latencies in new.items():
+        window = (samples.get((system, probe), []) + latencies)[-size:]
+        rows.append(
+            {
+                "system": system,
+                "probe": probe,
+                "samples": dumps(window),
+                "timeout": get_timeout(probe, window),
+                "timestamp": now,
+            }
+        )
+
+    ProbeLatency.insert_many(rows).on_conflict(
+        preserve=[ProbeLatency.samples, ProbeLatency.timeout, ProbeLatency.timestamp]
+    ).execute()
@@ -2,13 +2,16 @@
 
 from __future__ import annotations
 from datetime import date, datetime
-from typing import Any
+from json import loads
+from typing import Any, Iterable, Union
 
 from peewee import JOIN
+from peewee import BigIntegerField
 from peewee import BooleanField
 from peewee import CharField
 from peewee import DateField
 from peewee import DateTimeField
+from peewee import FloatField
 from peewee import ForeignKeyField
 from peewee import IntegerField
 from peewee import ModelSelect
@@ -39,6 +42,10 @@ __all__ = [
     "CheckResults",
     "NewestCheckResults",
     "OfflineHistory",
+    "LogState",
+    "CheckTimeout",
+    "ProbeLatency",
+    "Capability",
     "UserNotificationEmail",
     "ExtraUserNotificationEmail",
     "StatisticUserNotificationEmail",
@@ -89,6 +96,9 @@ class CheckResults(SysmonModel):
     efi_mount_ok = EnumField(SuccessFailedUnsupported)
     download = IntegerField(null=True)  # kbps
     upload = IntegerField(null=True)  # kbps
+    bandwidth_queue_time = FloatField(null=True)  # seconds
+    bandwidth_test_time = FloatField(null=True)  # seconds
+    bandwidth_timestamp = DateTimeField(null=True)  # of download and upload
     root_not_ro = EnumField(SuccessFailedUnsupported)
     sensors = EnumField(SuccessFailedUnsupported)
     in_sync = BooleanField(null=True)
@@ -103,6 +113,18 @@ class CheckResults(SysmonModel):
     hd_uptime = IntegerField(null=True)
     hd_size = IntegerField(null=True)   # MB
     hd_free = IntegerField(null=True)   # MB
+    duration = FloatField(null=True)  # seconds
+    # Latencies of successful probes in seconds
+    icmp_latency = FloatField(null=True)
+    sysinfo_latency = FloatField(null=True)
+    ssh_latency = FloatField(null=True)
+    iperf_latency = FloatField(null=True)  # per direction
+    # Bytes transferred to and from the system
+    bytes_sent = BigIntegerField(null=True)
+    bytes_received = BigIntegerField(null=True)
+    transfer = TextField(null=True)  # JSON: {probe: [sent, received]}
+    # Comma-separated names of probes that were skipped
+    not_collected = CharField(255, null=True)
 
     @classmethod
     def select(cls, *args, cascade: bool = False) -> ModelSelect:
@@ -145,6 +167,27 @@ class CheckResults(SysmonModel):
             self.icmp_request and self.ssh_login is not SuccessFailedUnsupported.FAILED
         )
 
+    @property
+    def not_collected_probes(self) -> list[str]:
+        """Returns the names of the probes that were skipped."""
+        if not self.not_collected:
+            return []
+
+        return self.not_collected.split(",")
+
+    @property
+    def transferred(self) -> int:
+        """Returns the total bytes transferred by the check."""
+        return (self.bytes_sent or 0) + (self.bytes_received or 0)
+
+    @property
+    def transfer_by_probe(self) -> dict[str, list[int]]:
+        """Returns the bytes sent and received per probe."""
+        if not self.transfer:
+            return {}
+
+        return loads(self.transfer)
+
     def low_bandwidth(self, required: int = MIN_DOWNLOAD) -> bool:
         """Determine whether the system has a low bandwidth."""
         if self.download is None:
@@ -160,14 +203,65 @@ class CheckResults(SysmonModel):
         json["hdUptime"] = self.hd_uptime
         json["hdSize"] = self.hd_size
         json["hdFree"] = self.hd_free
+        json["notCollected"] = self.not_collected_probes
+        json["transfer"] = self.transfer_by_probe
         return json
 
 
 class NewestCheckResults(CheckResults):
     """Storage container for newest Check result by System."""
 
+    system = ForeignKeyField(
+        System,
+        column_name="system",
+        unique=True,
+        on_delete="CASCADE",
+        on_update="CASCADE",
+        lazy_load=False,
+    )
     icmp_request = BooleanField()
 
+    @classmethod
+    def from_check_results(cls, check_results: CheckResults) -> NewestCheckResults:
+        """Creates a record from the given check results."""
+        return cls(
+            **{
+                field.name: check_results.__data__.get(field.name)
+                for field in CheckResults._meta.sorted_fields
+                if field is not CheckResults._meta.primary_key
+            }
+        )
+
+    @classmethod
+    def upsert(cls, *check_results: CheckResults) -> int:
+        """Updates or inserts the records of the respective systems.
+        Of several check results of a system, the newest one is stored.
+        Existing records are updated, so that no unique index on the
+        system is required.
+        """
+        rows = {
+            check.system_id: cls.from_check_results(check).__data__
+            for check in sorted(check_results, key=lambda check: check.timestamp)
+        }
+
+        if not rows:
+            return 0
+
+        existing = {
+            system
+            for system, in cls.select(cls.system)
+            .where(cls.system << list(rows))
+            .tuples()
+        }
+
+        for system in existing:
+            cls.update(rows[system]).where(cls.system == system).execute()
+
+        if new := [row for system, row in rows.items() if system not in existing]:
+            cls.insert_many(new).execute()
+
+        return len(rows)
+
 
 class OfflineHistory(SysmonModel):
     """History entries for offline systems."""
@@ -190,6 +284,95 @@ class OfflineHistory(SysmonModel):
         return cls.select().where(cls.timestamp >= timestamp)
 
 
+class LogState(SysmonModel):
+    """State of the incremental log collection of a system."""
+
+    system = ForeignKeyField(
+        System,
+        column_name="system",
+        unique=True,
+        on_delete="CASCADE",
+        on_update="CASCADE",
+        lazy_load=False,
+    )
+    chromium_inode = BigIntegerField(null=True)
+    chromium_offset = BigIntegerField(null=True)
+    chromium_log = TextField(null=True)
+    journal_cursor = TextField(null=True)
+    error_log = TextField(null=True)
+
+    @classmethod
+    def for_system(cls, system: Union[System, int]) -> LogState:
+        """Returns the existing or a new log state for the given system."""
+        try:
+            return cls.get(cls.system == system)
+        except cls.DoesNotExist:
+            return cls(system=system)
+
+
+class CheckTimeout(SysmonModel):
+    """Checks of systems that were aborted at their deadline."""
+
+    system = ForeignKeyField(
+        System,
+        column_name="system",
+        on_delete="CASCADE",
+        on_update="CASCADE",
+        lazy_load=False,
+    )
+    timestamp = DateTimeField(default=datetime.now)
+    deadline = FloatField()  # seconds
+
+    @classmethod
+    def record(cls, systems: Iterable[int], deadline: float) -> int:
+        """Records timeouts of the given systems."""
+        rows = [{"system": system, "deadline": deadline} for system in systems]
+
+        if not rows:
+            return 0
+
+        return cls.insert_many(rows).execute()
+
+
+class ProbeLatency(SysmonModel):
+    """Recent latencies of a probe of a system and the timeout learned from them."""
+
+    class Meta:
+        indexes = ((("system", "probe"), True),)
+
+    system = ForeignKeyField(
+        System,
+        column_name="system",
+        on_delete="CASCADE",
+        on_update="CASCADE",
+        lazy_load=False,
+    )
+    probe = CharField(32)
+    samples = TextField()  # JSON list of seconds
+    timeout = IntegerField()  # seconds
+    timestamp = DateTimeField(default=datetime.now)
+
+
+class Capability(SysmonModel):
+    """A cached capability of a system, e.g. its SSH
+    user or a probe that it does not support.
+    """
+
+    class Meta:
+        indexes = ((("system", "name"), True),)
+
+    system = ForeignKeyField(
+        System,
+        column_name="system",
+        on_delete="CASCADE",
+        on_update="CASCADE",
+        lazy_load=False,
+    )
+    name = CharField(32)  # "ssh_user" or probe name
+    value = CharField(32)  # SSH user or consecutive failures of the probe
+    expires = DateTimeField()
+
+
 class ExtraUserNotificationEmail(SysmonModel):
     """Stores emails for notifications about new messages."""
 
@@ -0,0 +1,61 @@
+"""Ordering of the systems of a collection run."""
+
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from peewee import fn
+
+from hwdb import System
+
+from sysmon.config import LOGGER, get_config
+from sysmon.orm import CheckResults
+
+
+__all__ = ["get_expected_durations", "plan"]
+
+
+WINDOW = 7  # days
+
+
+def get_window() -> timedelta:
+    """Return the configured time span of checks to learn durations from."""
+
+    return timedelta(days=get_config().getint("planner", "window", fallback=WINDOW))
+
+
+def get_expected_durations(since: datetime) -> dict[int, float]:
+    """Returns the average check duration of each system since
+    the given datetime by system ID in one query.
+    Systems without timed checks are omitted.
+    """
+
+    return dict(
+        CheckResults.select(CheckResults.system, fn.AVG(CheckResults.duration))
+        .where(
+            (CheckResults.timestamp >= since) & (~(CheckResults.duration >> None))
+        )
+        .group_by(CheckResults.system)
+        .tuples()
+    )
+
+
+def plan(
+    systems: Iterable[System], now: Optional[datetime] = None
+) -> list[System]:
+    """Orders the systems by their expected check duration, longest first,
+    so that slow systems do not end up as a long tail of the run.
+    Systems without known duration are expected to be slowest.
+    """
+
+    durations = get_expected_durations((now or datetime.now()) - get_window())
+    systems = sorted(
+        systems,
+        key=lambda system: durations.get(system.id, float("inf")),
+        reverse=True,
+    )
+    LOGGER.info(
+        "Planned %i systems, %i with known duration.",
+        len(systems),
+        sum(system.id in durations for system in systems),
+    )
+    return systems
@@ -0,0 +1,243 @@
+"""Continuous scheduling of checks with per-kind intervals."""
+
+from __future__ import annotations
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio import Semaphore, Task, create_task, run, sleep, to_thread
+from collections import defaultdict
+from datetime import date
+from heapq import heappop, heappush
+from time import time
+from typing import Callable, Iterable, Optional
+from zlib import crc32
+
+from hwdb import System
+
+from sysmon.blacklist import load_blacklist
+from sysmon.capabilities import capability_cache_enabled, load_capabilities
+from sysmon.checks.pipeline import CHECK_KINDS, create_check_with_deadline
+from sysmon.checks.pipeline import get_deadline, get_newest_check
+from sysmon.checks.prefetch import Prefetched, prefetch
+from sysmon.checks.recheck import RecheckQueue, needs_recheck
+from sysmon.collector import get_concurrency
+from sysmon.concurrency import AdaptiveSemaphore, ConcurrencyController
+from sysmon.concurrency import adaptive_concurrency_enabled
+from sysmon.config import LOGGER, get_config
+from sysmon.offline_history import update_offline_systems
+from sysmon.orm import CheckTimeout, NewestCheckResults
+from sysmon.writer import CheckWriter
+
+
+__all__ = ["Scheduler", "get_intervals", "schedule"]
+
+
+INTERVALS = {
+    "icmp": 5 * 60,
+    "sysinfo": 60 * 60,
+    "logs": 24 * 60 * 60,
+    "bandwidth": 7 * 24 * 60 * 60,
+}  # seconds
+RELOAD_INTERVAL = 60 * 60  # seconds
+MAX_SLEEP = 60  # seconds
+
+
+def get_intervals() -> dict[str, int]:
+    """Return the configured intervals of the kinds of checks in seconds."""
+
+    config = get_config()
+    return {
+        kind: config.getint("scheduler", kind, fallback=interval)
+        for kind, interval in INTERVALS.items()
+    }
+
+
+def get_offset(system: int, kind: str, interval: int) -> int:
+    """Return a stable offset of the system's check within the interval,
+    which spreads the checks of all systems evenly over the interval.
+    """
+
+    return crc32(f"{kind}:{system}".encode()) % interval
+
+
+class Scheduler:
+    """Runs due checks from a priority queue ordered by due time."""
+
+    def __init__(
+        self,
+        load_systems: Callable[[], Iterable[System]],
+        *,
+        intervals: Optional[dict[str, int]] = None,
+        concurrency: Optional[int] = None,
+        reload_interval: int = RELOAD_INTERVAL,
+    ):
+        self.load_systems = load_systems
+        self.intervals = intervals or get_intervals()
+        concurrency = concurrency or get_concurrency()
+        self.controller = (
+            ConcurrencyController.from_config(concurrency)
+            if adaptive_concurrency_enabled()
+            else None
+        )
+        self.semaphore = (
+            Semaphore(concurrency)
+            if self.controller is None
+            else AdaptiveSemaphore(self.controller)
+        )
+        self.reload_interval = reload_interval
+        self.queue: list[tuple[float, int, str]] = []
+        self.systems: dict[int, System] = {}
+        self.prefetched = Prefetched(last_checks={}, touch_events={})
+        self.running: set[int] = set()
+        self.tasks: set[Task] = set()
+        self.writer: Optional[CheckWriter] = None
+        self.rechecks: Optional[RecheckQueue] = None
+
+    async def run(self) -> None:
+        """Runs the scheduler forever."""
+        with CheckWriter(controller=self.controller) as self.writer:
+            self.rechecks = RecheckQueue(self.writer, semaphore=self.semaphore)
+            next_reload = 0
+
+            while True:
+                if time() >= next_reload:
+                    await self.reload()
+                    next_reload = time() + self.reload_interval
+
+                for system, kinds in self.pop_due(time()).items():
+                    self.start(system, kinds)
+
+                wakeup = min(next_reload, time() + MAX_SLEEP)
+
+                if self.queue:
+                    wakeup = min(wakeup, self.queue[0][0])
+
+                await sleep(max(0, wakeup - time()))
+
+    async def reload(self) -> None:
+        """Reloads the systems and the fleet-wide prefetched data,
+        schedules new systems and updates the offline history.
+        """
+        systems = await to_thread(lambda: list(self.load_systems()))
+        known = set(self.systems)
+        self.systems = {system.id: system for system in systems}
+        self.prefetched = (await to_thread(prefetch, systems))._replace(
+            last_checks={}
+        )
+        self.rechecks.prefetched = self.prefetched
+        now = time()
+
+        for system in self.systems.keys() - known:
+            for kind, interval in self.intervals.items():
+                due = now - now % interval + get_offset(system, kind, interval)
+
+                if due < now:
+                    due += interval
+
+                heappush(self.queue, (due, system, kind))
+
+        LOGGER.info("Scheduling checks of %i systems.", len(self.systems))
+        await to_thread(
+            update_offline_systems, date.today(), blacklist=load_blacklist()
+        )
+
+    def pop_due(self, now: float) -> dict[int, set[str]]:
+        """Pops all due checks, reschedules them and
+        returns the due kinds of checks per system.
+        """
+        due = defaultdict(set)
+
+        while self.queue and self.queue[0][0] <= now:
+            timestamp, system, kind = heappop(self.queue)
+
+            if system not in self.systems:
+                continue
+
+            due[system].add(kind)
+            interval = self.intervals[kind]
+            # Skip missed runs instead of catching up on them.
+            timestamp += interval * ((now - timestamp) // interval + 1)
+            heappush(self.queue, (timestamp, system, kind))
+
+        return due
+
+    def start(self, system: int, kinds: set[str]) -> None:
+        """Starts checking the system unless a check of it is still running."""
+        if system in self.running:
+            LOGGER.warning("Skipping %s of busy system: %i", sorted(kinds), system)
+            return
+
+        self.running.add(system)
+        task = create_task(self.check(self.systems[system], frozenset(kinds)))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def check(self, system: System, kinds: frozenset[str]) -> None:
+        """Runs the given kinds of checks on the system and stores the results.
+        Only checks that ran more than ICMP or changed the online
+        state are added to the history of check results.
+        """
+        try:
+            async with self.semaphore:
+                last_check = await to_thread(get_newest_check, system.id)
+                kinds = CHECK_KINDS if last_check is None else kinds
+                check_results = await create_check_with_deadline(
+                    system,
+                    kinds=kinds,
+                    prefetched=await self.get_prefetched(system, last_check),
+                    last_check=last_check,
+                )
+                history = (
+                    kinds != {"icmp"}
+                    or last_check is None
+                    or check_results.online != last_check.online
+                )
+                await to_thread(self.writer.put, check_results, history=history)
+
+            if self.controller is not None:
+                self.controller.complete(check_results)
+
+            if needs_recheck(check_results):
+                self.rechecks.put(system, check_results)
+        except AsyncTimeoutError:
+            LOGGER.warning("Check of system %i exceeded its deadline.", system.id)
+            await to_thread(CheckTimeout.record, [system.id], get_deadline())
+
+            if self.controller is not None:
+                self.controller.timeout()
+        except Exception:
+            LOGGER.exception("Exception in scheduled check, system: %i", system.id)
+        finally:
+            self.running.discard(system.id)
+
+    async def get_prefetched(
+        self, system: System, last_check: Optional[NewestCheckResults]
+    ) -> Prefetched:
+        """Return the prefetched data for a check of the system.
+        Its last checks and capabilities change between checks.
+        """
+        prefetched = self.prefetched.subset(system)
+        last_checks = {} if last_check is None else {system.id: last_check}
+
+        for representative in prefetched.site_representatives.values():
+            if site_check := await to_thread(get_newest_check, representative):
+                last_checks[representative] = site_check
+
+        if capability_cache_enabled():
+            prefetched = prefetched._replace(
+                capabilities={
+                    system.id: await to_thread(load_capabilities, system.id)
+                }
+            )
+
+        return prefetched._replace(last_checks=last_checks)
+
+
+def schedule(
+    load_systems: Callable[[], Iterable[System]],
+    *,
+    concurrency: Optional[int] = None,
+) -> None:
+    """Runs the continuous scheduler."""
+
+    scheduler = Scheduler(load_systems, concurrency=concurrency)
+    LOGGER.info("Check intervals: %s", scheduler.intervals)
+    run(scheduler.run())
@@ -0,0 +1,172 @@
+"""Notification of the smitrac API about new checks."""
+
+from __future__ import annotations
+from atexit import register
+from functools import cache
+from json import dumps
+from queue import Full, Queue
+from threading import Thread
+from time import sleep
+from typing import Any, Optional
+
+from requests import RequestException, Session
+
+from sysmon.config import LOGGER, get_config
+from sysmon.orm import CheckResults
+
+
+__all__ = ["SmitracDispatcher", "get_dispatcher", "notify"]
+
+
+BATCH_SIZE = 50
+QUEUE_SIZE = 1000
+RETRIES = 3
+BACKOFF = 1  # seconds
+TIMEOUT = 10  # seconds
+
+
+class SmitracDispatcher:
+    """Sends notifications from a bounded queue
+    over a reusable keep-alive HTTP session.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        password: str,
+        *,
+        batch_size: int = BATCH_SIZE,
+        queue_size: int = QUEUE_SIZE,
+        retries: int = RETRIES,
+        backoff: float = BACKOFF,
+        timeout: float = TIMEOUT,
+    ):
+        self.url = url
+        self.password = password
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.queue: Queue[Optional[dict[str, Any]]] = Queue(queue_size)
+        self.session = Session()
+        self.thread = Thread(target=self.run, daemon=True)
+
+    def __enter__(self) -> SmitracDispatcher:
+        self.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    @classmethod
+    def from_config(cls) -> SmitracDispatcher:
+        """Creates a dispatcher from the configuration file."""
+        config = get_config()
+        return cls(
+            config.get("smitrac", "url"),
+            config.get("smitrac", "apipassword"),
+            batch_size=config.getint("smitrac", "batch_size", fallback=BATCH_SIZE),
+            queue_size=config.getint("smitrac", "queue_size", fallback=QUEUE_SIZE),
+            retries=config.getint("smitrac", "retries", fallback=RETRIES),
+            backoff=config.getfloat("smitrac", "backoff", fallback=BACKOFF),
+            timeout=config.getfloat("smitrac", "timeout", fallback=TIMEOUT),
+        )
+
+    def start(self) -> None:
+        """Starts the dispatcher thread."""
+        self.thread.start()
+
+    def put(self, system_check: CheckResults) -> None:
+        """Enqueues a notification about the given check.
+        The notification is dropped if the queue is full.
+        """
+        if (deployment := system_check.system.deployment) is None:
+            return
+
+        try:
+            self.queue.put_nowait(
+                {"customer": deployment.customer_id, "system": system_check.system_id}
+            )
+        except Full:
+            LOGGER.warning(
+                "Smitrac queue full. Dropping notification for system: %i",
+                system_check.system_id,
+            )
+
+    def flush(self) -> None:
+        """Waits until all queued notifications have been sent."""
+        self.queue.join()
+
+    def close(self) -> None:
+        """Sends the remaining notifications and stops the dispatcher."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+        self.session.close()
+
+    def run(self) -> None:
+        """Sends batches of notifications until the stop sentinel is received."""
+        while True:
+            batch = [self.queue.get()]
+
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                if self.queue.empty():
+                    break
+
+                batch.append(self.queue.get())
+
+            for notification in batch:
+                if notification is not None:
+                    self.send(notification)
+
+                self.queue.task_done()
+
+            if batch[-1] is None:
+                return
+
+    def send(self, notification: dict[str, Any]) -> bool:
+        """Posts a notification, retrying with exponential backoff."""
+        data = dumps({**notification, "password": self.password})
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                sleep(self.backoff * 2 ** (attempt - 1))
+
+            try:
+                response = self.session.post(self.url, data=data, timeout=self.timeout)
+            except RequestException as error:
+                LOGGER.warning("Could not notify smitrac: %s", error)
+                continue
+
+            if response.status_code < 500:
+                return True
+
+            LOGGER.warning("Smitrac API returned status: %i", response.status_code)
+
+        LOGGER.error(
+            "Giving up notifying smitrac about system: %i", notification["system"]
+        )
+        return False
+
+
+@cache
+def get_dispatcher() -> Optional[SmitracDispatcher]:
+    """Returns the running dispatcher of this process,
+    or None if the smitrac notification is disabled.
+    """
+
+    if not get_config().get("smitrac", "enabled"):
+        return None
+
+    dispatcher = SmitracDispatcher.from_config()
+    dispatcher.start()
+    register(dispatcher.close)
+    return dispatcher
+
+
+def notify(system_check: CheckResults) -> None:
+    """Notifies the smitrac API about the given check."""
+
+    if (dispatcher := get_dispatcher()) is not None:
+        dispatcher.put(system_check)
@@ -0,0 +1,151 @@
+"""Single writer stage for check results."""
+
+from __future__ import annotations
+from queue import Queue
+from threading import Thread
+from time import perf_counter
+from typing import Any, Optional, Sequence
+
+from sysmon.concurrency import ConcurrencyController
+from sysmon.config import LOGGER, get_config
+from sysmon.latency import record_latencies
+from sysmon.orm import DATABASE, CheckResults, NewestCheckResults
+from sysmon.smitrac import get_dispatcher, notify
+
+
+__all__ = [
+    "CheckWriter",
+    "write_batch",
+]
+
+
+BATCH_SIZE = 100
+QUEUE_SIZE = 1000
+
+
+def get_batch_size() -> int:
+    """Return the configured amount of check results to insert at once."""
+
+    return get_config().getint("writer", "batch_size", fallback=BATCH_SIZE)
+
+
+def get_queue_size() -> int:
+    """Return the configured amount of check results to buffer."""
+
+    return get_config().getint("writer", "queue_size", fallback=QUEUE_SIZE)
+
+
+def get_row(check_results: CheckResults) -> dict[str, Any]:
+    """Return the column values of the check results for insert_many()."""
+
+    return {
+        field.name: check_results.__data__.get(field.name)
+        for field in CheckResults._meta.sorted_fields
+        if field is not CheckResults._meta.primary_key
+    }
+
+
+def write_batch(
+    check_results: Sequence[CheckResults], newest_only: Sequence[CheckResults] = ()
+) -> None:
+    """Inserts the check results and upserts the respective
+    newest check results and probe latencies within one transaction.
+    Check results in `newest_only` only update the newest check results.
+    """
+
+    if not check_results and not newest_only:
+        return
+
+    with DATABASE.atomic():
+        if check_results:
+            CheckResults.insert_many(map(get_row, check_results)).execute()
+
+        NewestCheckResults.upsert(*check_results, *newest_only)
+        record_latencies([*check_results, *newest_only])
+
+    for check in check_results:
+        notify(check)
+
+
+class CheckWriter:
+    """Stores check results streamed by the workers in batches.
+
+    The queue is bounded, so that producers
+    block while the database falls behind.
+    Write times and errors are reported to the concurrency controller.
+    """
+
+    def __init__(
+        self,
+        *,
+        batch_size: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        controller: Optional[ConcurrencyController] = None,
+    ):
+        self.batch_size = batch_size or get_batch_size()
+        self.queue: Queue[Optional[tuple[CheckResults, bool]]] = Queue(
+            queue_size or get_queue_size()
+        )
+        self.thread = Thread(target=self.run, daemon=True)
+        self.controller = controller
+        self.written = 0
+
+    def __enter__(self) -> CheckWriter:
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.queue.put(None)
+        self.thread.join()
+
+        if (dispatcher := get_dispatcher()) is not None:
+            dispatcher.flush()
+
+    def put(self, check_results: CheckResults, *, history: bool = True) -> None:
+        """Enqueues check results for writing.
+        Without history, only the newest check results are updated.
+        """
+
+        self.queue.put((check_results, history))
+
+    def run(self) -> None:
+        """Writes batches until the stop sentinel is received."""
+
+        while True:
+            batch = [item := self.queue.get()]
+
+            while item is not None and len(batch) < self.batch_size:
+                if self.queue.empty():
+                    break
+
+                batch.append(item := self.queue.get())
+
+            if item is None:
+                batch.pop()
+
+            self.flush(batch)
+
+            if item is None:
+                LOGGER.info("Wrote %i check results.", self.written)
+                return
+
+    def flush(self, batch: list[tuple[CheckResults, bool]]) -> None:
+        """Writes a batch of check results."""
+
+        start = perf_counter()
+
+        try:
+            write_batch(
+                [check for check, history in batch if history],
+                [check for check, history in batch if not history],
+            )
+        except Exception:
+            LOGGER.exception("Could not write %i check results.", len(batch))
+
+            if self.controller is not None:
+                self.controller.write_failed()
+        else:
+            self.written += len(batch)
+
+            if self.controller is not None:
+                self.controller.written(perf_counter() - start)
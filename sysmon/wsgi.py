@@ -23,6 +23,7 @@ from sysmon.functions import get_check_results_for_system
 from sysmon.functions import get_customer_check_results
 from sysmon.functions import get_system
 from sysmon.functions import get_latest_check_results_per_system
+from sysmon.latency import get_latency_stats
 from sysmon.mailing import send_warning_test_mails
 from sysmon.offline_history import get_offline_systems
 from sysmon.offline_history import update_offline_systems
@@ -139,6 +140,15 @@ def do_quickcheck_system(system: int) -> JSON:
     return JSON(check_result.to_json())
 
 
+@APPLICATION.route("/timeouts/<int:system>", methods=["GET"], strict_slashes=False)
+@authenticated
+@authorized("sysmon")
+def probe_timeouts(system: int) -> JSON:
+    """List the probe latencies and learned timeouts of a system."""
+
+    return JSON(get_latency_stats(get_system(system, ACCOUNT).id))
+
+
 @APPLICATION.route("/screenshot/<int:system>", methods=["GET"], strict_slashes=False)
 @authenticated
 @authorized("sysmon")
@@ -0,0 +1,119 @@
+"""Tests of the bandwidth probe."""
+
+from asyncio import TimeoutError as AsyncTimeoutError
+from asyncio import sleep
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, patch
+
+from sysmon.checks.iperf3 import Bandwidth
+from sysmon.checks.pipeline import create_check_with_deadline, get_bandwidth
+from sysmon.checks.prefetch import Prefetched
+from sysmon.enumerations import BandwidthPolicy, SuccessFailedUnsupported
+from sysmon.orm import CheckResults
+
+
+NOW = datetime(2024, 1, 1, 12)
+MEASURED = Bandwidth(1000, 500, 0, 10, NOW)
+
+
+class TestSiteBandwidth(IsolatedAsyncioTestCase):
+    """Tests taking over the measurement of the site representative."""
+
+    async def get_bandwidth(self, site_check: CheckResults) -> Bandwidth:
+        """Return the bandwidth of a system whose own measurement expired."""
+        with patch(
+            "sysmon.checks.pipeline.measure_bandwidth_async",
+            AsyncMock(return_value=MEASURED),
+        ):
+            return await get_bandwidth(
+                SimpleNamespace(id=2, deployment=None),
+                NOW,
+                BandwidthPolicy.CACHED,
+                last_check=None,
+                site_check=site_check,
+            )
+
+    async def test_valid_site_measurement_is_used(self):
+        """A recent measurement of the representative is taken over."""
+        site_check = CheckResults(
+            system=1, download=2000, upload=1000, bandwidth_timestamp=NOW
+        )
+        self.assertEqual((await self.get_bandwidth(site_check)).download, 2000)
+
+    async def test_expired_site_measurement_is_not_used(self):
+        """The system is measured if the representative's measurement expired."""
+        site_check = CheckResults(
+            system=1,
+            download=2000,
+            upload=1000,
+            bandwidth_timestamp=NOW - timedelta(days=90),
+        )
+        self.assertEqual(await self.get_bandwidth(site_check), MEASURED)
+
+    async def test_failed_site_measurement_is_not_used(self):
+        """The system is measured if the representative's measurement failed."""
+        site_check = CheckResults(
+            system=1, download=None, upload=None, bandwidth_timestamp=NOW
+        )
+        self.assertEqual(await self.get_bandwidth(site_check), MEASURED)
+
+    async def test_missing_site_measurement_is_not_used(self):
+        """The system is measured if the representative was never measured."""
+        site_check = CheckResults(system=1, download=None, upload=None)
+        self.assertEqual(await self.get_bandwidth(site_check), MEASURED)
+
+
+async def wait_for_slot(*_, **__) -> Bandwidth:
+    """Wait for an iperf3 slot that does not become free."""
+
+    await sleep(10)
+    return MEASURED
+
+
+class TestDeadline(IsolatedAsyncioTestCase):
+    """Tests the deadline of checks that measure the bandwidth."""
+
+    async def check(self, **patches: AsyncMock) -> CheckResults:
+        """Check a reachable system within a short deadline."""
+        mocks = {
+            "check_icmp_request_async": AsyncMock(return_value=True),
+            "get_sysinfo_async": AsyncMock(
+                return_value=(SuccessFailedUnsupported.SUCCESS, {})
+            ),
+            "get_application_async": AsyncMock(return_value=None),
+            "measure_bandwidth_async": AsyncMock(return_value=MEASURED),
+            **patches,
+        }
+
+        with patch.multiple("sysmon.checks.pipeline", **mocks):
+            return await create_check_with_deadline(
+                SimpleNamespace(
+                    id=1,
+                    ddb_os=False,
+                    deployment=None,
+                    deployment_id=None,
+                    operating_system=None,
+                    ip_address="192.0.2.1",
+                ),
+                deadline=0.5,
+                prefetched=Prefetched(last_checks={}, touch_events={}),
+                gate=False,
+                bundle=False,
+                incremental=False,
+            )
+
+    async def test_waiting_bandwidth_probe_is_not_collected(self):
+        """Only the bandwidth probe is given up at the deadline."""
+        check_results = await self.check(
+            measure_bandwidth_async=AsyncMock(side_effect=wait_for_slot)
+        )
+        self.assertEqual(check_results.not_collected_probes, ["bandwidth"])
+        self.assertIsNone(check_results.download)
+        self.assertTrue(check_results.icmp_request)
+
+    async def test_other_probes_exceeding_the_deadline(self):
+        """The check fails if any other probe exceeds the deadline."""
+        with self.assertRaises(AsyncTimeoutError):
+            await self.check(get_sysinfo_async=AsyncMock(side_effect=wait_for_slot))
@@ -0,0 +1,53 @@
+"""Tests of the capability cache."""
+
+from unittest import TestCase
+
+from sysmon.capabilities import Capabilities
+
+
+def record(capabilities: Capabilities, failures: dict[str, bool]) -> Capabilities:
+    """Return the capabilities after storing the results of a check."""
+
+    store, delete = capabilities.update(None, failures)
+    entries = {
+        name: int(value)
+        for name, value in {**capabilities.failures, **store}.items()
+        if name not in delete
+    }
+    return Capabilities(
+        current=frozenset(entries), stored=frozenset(entries), failures=entries
+    )
+
+
+class TestCapabilities(TestCase):
+    """Tests caching unsupported probes."""
+
+    def test_single_sysinfo_failure(self):
+        """A single failed HTTP request does not skip sysinfo."""
+        capabilities = record(Capabilities(), {"sysinfo": True})
+        self.assertEqual(capabilities.failures, {"sysinfo": 1})
+        self.assertEqual(capabilities.unsupported, frozenset())
+
+    def test_consecutive_sysinfo_failures(self):
+        """Consecutive failed HTTP requests skip sysinfo."""
+        capabilities = Capabilities()
+
+        for _ in range(3):
+            capabilities = record(capabilities, {"sysinfo": True})
+
+        self.assertEqual(capabilities.unsupported, {"sysinfo"})
+
+    def test_success_resets_failures(self):
+        """A successful HTTP request resets the count of failures."""
+        capabilities = Capabilities()
+
+        for failed in [True, True, False, True, True]:
+            capabilities = record(capabilities, {"sysinfo": failed})
+
+        self.assertEqual(capabilities.failures, {"sysinfo": 2})
+        self.assertEqual(capabilities.unsupported, frozenset())
+
+    def test_smartctl_failure(self):
+        """A missing smartctl output skips smartctl at once."""
+        capabilities = record(Capabilities(), {"smartctl_full": True})
+        self.assertEqual(capabilities.unsupported, {"smartctl_full"})
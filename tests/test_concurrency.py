@@ -0,0 +1,64 @@
+"""Tests of the adaptive concurrency controller."""
+
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+
+from sysmon.concurrency import ConcurrencyController
+from sysmon.enumerations import SuccessFailedUnsupported
+from sysmon.writer import CheckWriter
+
+
+def measured(failed: bool) -> SimpleNamespace:
+    """Return a check of a reachable system with an iperf3 measurement."""
+
+    return SimpleNamespace(
+        icmp_request=True,
+        ssh_login=SuccessFailedUnsupported.SUCCESS,
+        bandwidth_test_time=1.0,
+        download=None if failed else 100,
+        upload=None if failed else 10,
+    )
+
+
+class TestConcurrencyController(TestCase):
+    """Tests the concurrency controller."""
+
+    def setUp(self):
+        patcher = patch(
+            "sysmon.concurrency.ConcurrencyController.overloaded", False
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.controller = ConcurrencyController(
+            10, maximum=20, samples=10, max_failure_rate=0.5
+        )
+
+    def test_single_iperf3_failure(self):
+        """A single failed iperf3 measurement does not decrease the limit."""
+        for failed in [True] + [False] * 9:
+            self.controller.complete(measured(failed))
+
+        self.assertGreater(self.controller.window, 10)
+
+    def test_correlated_iperf3_failures(self):
+        """Many failed iperf3 measurements decrease the limit."""
+        for failed in [True, False] * 3 + [True] * 4:
+            self.controller.complete(measured(failed))
+
+        self.assertLess(self.controller.limit, 10)
+
+    def test_slow_writes(self):
+        """Slow database writes decrease the limit."""
+        self.controller.written(self.controller.max_write_time / 2)
+        self.assertEqual(self.controller.limit, 10)
+        self.controller.written(self.controller.max_write_time * 2)
+        self.assertEqual(self.controller.limit, 5)
+
+    def test_write_errors(self):
+        """Database errors of the writer decrease the limit."""
+        with patch("sysmon.writer.write_batch", side_effect=OSError):
+            with CheckWriter(controller=self.controller) as writer:
+                writer.put(SimpleNamespace(system_id=1))
+
+        self.assertEqual(self.controller.limit, 5)
@@ -0,0 +1,24 @@
+"""Tests of the incremental error log."""
+
+from datetime import datetime
+from unittest import TestCase
+
+from sysmon.checks.logs import ERROR_LOG_MAX_BYTES, _update_error_log
+from sysmon.orm import LogState
+
+
+class TestIncrementalErrorLog(TestCase):
+    """Tests the stored rolling window of critical journal entries."""
+
+    def test_stored_window_is_capped(self):
+        """A chatty journal does not exceed the TEXT column."""
+        timestamp = datetime.now().astimezone().isoformat(timespec="seconds")
+        output = "\n".join(
+            f"{timestamp} host kernel: critical entry {index:06d}"
+            for index in range(10000)
+        )
+        log_state = LogState()
+        _update_error_log(log_state, f"{output}\n-- cursor: abc", 150)
+        self.assertLessEqual(len(log_state.error_log.encode()), ERROR_LOG_MAX_BYTES)
+        self.assertTrue(log_state.error_log.endswith("critical entry 009999"))
+        self.assertEqual(log_state.journal_cursor, "abc")
@@ -0,0 +1,50 @@
+"""Tests of the ICMP echo request check."""
+
+from subprocess import CalledProcessError, TimeoutExpired
+from types import SimpleNamespace
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, patch
+
+from sysmon.checks.icmp import check_icmp_request_async
+from sysmon.checks.transfer import TRANSFERS
+
+
+SYSTEM = SimpleNamespace(ip_address="192.0.2.1")
+OUTPUT = """PING 192.0.2.1 (192.0.2.1) 56(84) bytes of data.
+64 bytes from 192.0.2.1: icmp_seq=1 ttl=64 time=0.05 ms
+64 bytes from 192.0.2.1: icmp_seq=3 ttl=64 time=0.05 ms
+
+--- 192.0.2.1 ping statistics ---
+3 packets transmitted, {} received, 0% packet loss, time 2049ms
+"""
+
+
+class TestICMPTransfer(IsolatedAsyncioTestCase):
+    """Tests accounting the packets of ping."""
+
+    async def ping(self, **mock) -> tuple[bool, dict[str, list[int]]]:
+        """Ping the system and return the result and the transfers."""
+        TRANSFERS.set(transfers := {})
+
+        with patch("sysmon.checks.icmp.run_async", AsyncMock(**mock)):
+            return await check_icmp_request_async(SYSTEM), transfers
+
+    async def test_replies(self):
+        """The reported requests and replies are accounted."""
+        self.assertEqual(
+            await self.ping(return_value=OUTPUT.format(2)),
+            (True, {"other": [252, 168]}),
+        )
+
+    async def test_no_replies(self):
+        """Failed pings account their requests only."""
+        error = CalledProcessError(1, "ping", OUTPUT.format(0).encode())
+        self.assertEqual(
+            await self.ping(side_effect=error), (False, {"other": [252, 0]})
+        )
+
+    async def test_timeout(self):
+        """Pings that time out report nothing to account."""
+        self.assertEqual(
+            await self.ping(side_effect=TimeoutExpired("ping", 5)), (False, {})
+        )
@@ -0,0 +1,39 @@
+"""Tests of the probe latencies that the timeouts are learned from."""
+
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock
+
+from sysmon.checks.pipeline import NOT_COLLECTED, timed
+from sysmon.enumerations import SuccessFailedUnsupported
+
+
+class TestTimed(IsolatedAsyncioTestCase):
+    """Tests timing the probes."""
+
+    async def time(self, result) -> dict[str, float]:
+        """Return the latencies of a probe with the given result."""
+        latencies = {}
+        await timed(AsyncMock(return_value=result), "probe", latencies)()
+        return latencies
+
+    async def test_successes_are_timed(self):
+        """The latencies of successful probes are recorded."""
+        for result in [
+            True,
+            SuccessFailedUnsupported.SUCCESS,
+            (SuccessFailedUnsupported.SUCCESS, {}),
+        ]:
+            with self.subTest(result=result):
+                self.assertIn("probe", await self.time(result))
+
+    async def test_failures_are_not_timed(self):
+        """The latencies of failed or skipped probes are not recorded."""
+        for result in [
+            False,
+            SuccessFailedUnsupported.FAILED,
+            SuccessFailedUnsupported.UNSUPPORTED,
+            (SuccessFailedUnsupported.UNSUPPORTED, {}),
+            NOT_COLLECTED,
+        ]:
+            with self.subTest(result=result):
+                self.assertEqual(await self.time(result), {})
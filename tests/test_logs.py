@@ -0,0 +1,113 @@
+"""Tests of the log probes."""
+
+from pathlib import Path
+from subprocess import PIPE, run
+from unittest import TestCase, skipIf
+
+from sysmon.checks.logs import CHROMIUM_LOG_PATH, CHROMIUM_LOG_REMOTE_FILTER
+from sysmon.checks.logs import ERROR_LOG_REMOTE_FILTER, _bundle_command
+from sysmon.checks.logs import _bundle_script, _decode, _filter_chromium_log
+from sysmon.checks.logs import _filter_error_log, _make_log_bundle, _parse_bundle
+from sysmon.orm import LogState
+
+
+SECTIONS = {
+    "text": "printf 'first line\\nsecond line\\n\\n'",
+    "binary": "printf 'a\\000b\\377\\n'",
+    "empty": "true",
+}
+
+
+class TestLogBundle(TestCase):
+    """Tests the bundled remote command."""
+
+    def test_sections_equal_separate_commands(self):
+        """Parsed sections equal the output of the separate commands."""
+        output = run(
+            ["/bin/sh", "-c", _bundle_script(SECTIONS)],
+            check=True,
+            stdout=PIPE,
+            text=True,
+        ).stdout
+        sections = _parse_bundle(output)
+
+        for name, command in SECTIONS.items():
+            with self.subTest(section=name):
+                self.assertEqual(
+                    sections[name],
+                    run(["/bin/sh", "-c", command], check=True, stdout=PIPE).stdout,
+                )
+
+    def test_failed_section_is_omitted(self):
+        """Sections whose command failed are omitted."""
+        output = run(
+            ["/bin/sh", "-c", _bundle_script({"failed": "false"})],
+            check=True,
+            stdout=PIPE,
+            text=True,
+        ).stdout
+        self.assertEqual(_parse_bundle(output), {})
+
+    def test_exiting_section_is_omitted(self):
+        """Sections that exit do not abort the following sections."""
+        output = run(
+            ["/bin/sh", "-c", _bundle_script({"exited": "exit 1", **SECTIONS})],
+            check=True,
+            stdout=PIPE,
+            text=True,
+        ).stdout
+        self.assertEqual(_parse_bundle(output).keys(), SECTIONS.keys())
+
+    @skipIf(Path(CHROMIUM_LOG_PATH).exists(), "Chromium log exists.")
+    def test_incremental_without_chromium_log(self):
+        """A missing Chromium log does not lose the other sections."""
+        output = run(
+            ["/bin/sh", "-c", _bundle_command("4 days ago", LogState(system=1))],
+            stdout=PIPE,
+            text=True,
+        ).stdout
+        self.assertIn("disk_usage", _parse_bundle(output))
+        bundle = _make_log_bundle(output, 150, LogState(system=1))
+        self.assertIsNone(bundle.chromium_log)
+        self.assertIsNotNone(bundle.hd_size)
+        self.assertIsNotNone(bundle.hd_free)
+
+
+class TestRemoteFilters(TestCase):
+    """Tests the filters run on the system before transfer."""
+
+    def filter(self, remote_filter: str, log: bytes) -> bytes:
+        """Run the remote filter locally."""
+        return run(
+            ["/bin/sh", "-c", remote_filter], input=log, stdout=PIPE
+        ).stdout
+
+    def test_chromium_log_with_binary_bytes(self):
+        """Binary bytes do not make grep suppress the lines."""
+        log = (
+            b"[1:2:ERROR:gpu_process_host.cc] GPU process exited\x00\xff\n"
+            b"[1:2:INFO:chrome_main.cc] started\n"
+            b"[1:2:ERROR:renderer.cc] renderer \x00crashed\n"
+            b"unrelated \x00 line\n"
+        )
+        self.assertEqual(
+            _filter_chromium_log(
+                _decode(self.filter(CHROMIUM_LOG_REMOTE_FILTER, log)), 150
+            ),
+            _filter_chromium_log(_decode(log), 150),
+        )
+
+    def test_error_log_with_binary_bytes(self):
+        """Binary bytes do not make grep suppress the lines."""
+        log = (
+            b"2024-01-01T00:00:00+0000 host kernel: oops \x00\xff\n"
+            b"2024-01-01T00:00:01+0000 host sshd[1]: ignored\n"
+            b"2024-01-01T00:00:02+0000 host app: failure\n"
+        )
+        self.assertEqual(
+            _filter_error_log(
+                self.filter(ERROR_LOG_REMOTE_FILTER, log).decode(errors="replace"),
+                150,
+            ),
+            _filter_error_log(log.decode(errors="replace"), 150),
+        )
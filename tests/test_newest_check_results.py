@@ -0,0 +1,61 @@
+"""Tests of the newest check results per system."""
+
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from peewee import SqliteDatabase
+
+from sysmon.enumerations import ApplicationState, BaytrailFreezeState
+from sysmon.enumerations import SuccessFailedUnsupported
+from sysmon.orm import CheckResults, NewestCheckResults
+
+
+def check(system: int, icmp_request: bool, timestamp: datetime) -> CheckResults:
+    """Return check results of the given system."""
+
+    return CheckResults(
+        system=system,
+        timestamp=timestamp,
+        icmp_request=icmp_request,
+        ssh_login=SuccessFailedUnsupported.SUCCESS,
+        http_request=SuccessFailedUnsupported.SUCCESS,
+        application_state=ApplicationState.HTML,
+        smart_check=SuccessFailedUnsupported.SUCCESS,
+        baytrail_freeze=BaytrailFreezeState.NOT_AFFECTED,
+        efi_mount_ok=SuccessFailedUnsupported.SUCCESS,
+        root_not_ro=SuccessFailedUnsupported.SUCCESS,
+        sensors=SuccessFailedUnsupported.SUCCESS,
+    )
+
+
+class TestUpsert(TestCase):
+    """Tests the upsert of the newest check results."""
+
+    def setUp(self):
+        database = SqliteDatabase(":memory:")
+        context = database.bind_ctx([NewestCheckResults])
+        context.__enter__()
+        self.addCleanup(context.__exit__, None, None, None)
+        # Like the live table, without a unique index on the system.
+        NewestCheckResults._schema.create_table(safe=False)
+        self.now = datetime.now()
+
+    def test_newest_check_per_system(self):
+        """Of several checks of a system, the newest one is stored."""
+        NewestCheckResults.upsert(
+            check(1, True, self.now),
+            check(2, False, self.now),
+            check(1, False, self.now - timedelta(minutes=5)),
+        )
+        newest = NewestCheckResults.select(
+            NewestCheckResults.system, NewestCheckResults.icmp_request
+        )
+        self.assertEqual(dict(newest.tuples()), {1: True, 2: False})
+
+    def test_existing_record_is_updated(self):
+        """Repeated upserts do not add records for the same system."""
+        NewestCheckResults.upsert(check(1, False, self.now - timedelta(minutes=5)))
+        NewestCheckResults.upsert(check(1, True, self.now))
+        self.assertEqual(
+            [newest.icmp_request for newest in NewestCheckResults.select()], [True]
+        )
@@ -0,0 +1,127 @@
+"""Tests of checks that only run some kinds of probes."""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, patch
+
+from sysmon.checks.pipeline import create_check_async
+from sysmon.checks.prefetch import Prefetched
+from sysmon.checks.recheck import RECHECK_KINDS, needs_recheck
+from sysmon.enumerations import SuccessFailedUnsupported
+from sysmon.orm import CheckResults
+
+
+SYSTEM = SimpleNamespace(
+    id=1,
+    ddb_os=False,
+    deployment=None,
+    deployment_id=None,
+    operating_system=None,
+    ip_address="192.0.2.1",
+)
+
+
+def failed_on_ssh(offline_since: datetime = None) -> CheckResults:
+    """Return a check of a system that failed because of SSH."""
+
+    return CheckResults(
+        system=SYSTEM.id,
+        timestamp=datetime.now() - timedelta(minutes=2),
+        icmp_request=True,
+        ssh_login=SuccessFailedUnsupported.FAILED,
+        http_request=SuccessFailedUnsupported.SUCCESS,
+        offline_since=offline_since,
+    )
+
+
+class TestPartialChecks(IsolatedAsyncioTestCase):
+    """Tests that partial checks do not inherit a stale failed SSH login."""
+
+    async def check(
+        self,
+        kinds: frozenset[str],
+        last_check: CheckResults,
+        *,
+        gate: bool = False,
+        icmp_request: bool = True,
+    ) -> CheckResults:
+        """Check the system with HTTP, SSH and optionally ICMP answering."""
+        with patch(
+            "sysmon.checks.pipeline.SSHSession.open",
+            AsyncMock(return_value=SuccessFailedUnsupported.SUCCESS),
+        ), patch(
+            "sysmon.checks.pipeline.get_disk_usage_async",
+            AsyncMock(return_value=(1000, 500)),
+        ), patch(
+            "sysmon.checks.pipeline.check_icmp_request_async",
+            AsyncMock(return_value=icmp_request),
+        ), patch(
+            "sysmon.checks.pipeline.get_sysinfo_async",
+            AsyncMock(return_value=(SuccessFailedUnsupported.SUCCESS, {})),
+        ), patch(
+            "sysmon.checks.pipeline.get_application_async",
+            AsyncMock(return_value=None),
+        ):
+            return await create_check_async(
+                SYSTEM,
+                prefetched=Prefetched(last_checks={}, touch_events={}),
+                kinds=kinds,
+                last_check=last_check,
+                gate=gate,
+                bundle=False,
+                incremental=False,
+            )
+
+    def test_ssh_failure_is_not_rechecked(self):
+        """Failed SSH logins are not rechecked, which could not confirm them."""
+        self.assertFalse(needs_recheck(failed_on_ssh()))
+
+    async def test_recheck_confirms_icmp_failure(self):
+        """A recheck that does not reach the system confirms the failure."""
+        failed = failed_on_ssh()
+        failed.icmp_request = False
+        self.assertTrue(needs_recheck(failed))
+
+        with patch(
+            "sysmon.checks.pipeline.confirm_offline_enabled", return_value=True
+        ):
+            check_results = await self.check(
+                RECHECK_KINDS, failed, icmp_request=False
+            )
+
+        self.assertFalse(check_results.online)
+        self.assertEqual(check_results.offline_since, failed.timestamp)
+
+    async def test_icmp_check_ends_offline_state(self):
+        """An ICMP-only check of a reachable system ends its offline state."""
+        check_results = await self.check(
+            frozenset({"icmp"}), failed_on_ssh(datetime.now() - timedelta(hours=1))
+        )
+        self.assertTrue(check_results.online)
+        self.assertIsNone(check_results.offline_since)
+
+    async def test_successful_ssh_login_is_carried_over(self):
+        """Successful SSH logins of the last check are still copied."""
+        last_check = failed_on_ssh()
+        last_check.ssh_login = SuccessFailedUnsupported.SUCCESS
+        check_results = await self.check(frozenset({"icmp"}), last_check)
+        self.assertIs(check_results.ssh_login, SuccessFailedUnsupported.SUCCESS)
+
+    async def test_gated_logs_check_of_reachable_system(self):
+        """A gated logs-only check of a reachable system collects the logs."""
+        check_results = await self.check(
+            frozenset({"logs"}), failed_on_ssh(), gate=True
+        )
+        self.assertIs(check_results.ssh_login, SuccessFailedUnsupported.SUCCESS)
+        self.assertEqual((check_results.hd_size, check_results.hd_free), (1000, 500))
+        self.assertEqual(check_results.not_collected_probes, [])
+
+    async def test_gated_logs_check_of_unreachable_system(self):
+        """A gated logs-only check of an unreachable system is skipped."""
+        last_check = failed_on_ssh()
+        last_check.icmp_request = False
+        last_check.http_request = SuccessFailedUnsupported.FAILED
+        check_results = await self.check(frozenset({"logs"}), last_check, gate=True)
+        self.assertIn("ssh_login", check_results.not_collected_probes)
+        self.assertIsNone(check_results.hd_size)
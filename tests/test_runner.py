@@ -0,0 +1,37 @@
+"""Tests of the process pool with a deadline per system."""
+
+from types import SimpleNamespace
+from unittest import TestCase
+
+from sysmon.concurrency import ConcurrencyController
+from sysmon.checks.runner import DeadlinePool
+
+
+def check(item):
+    """Return the ID of the system."""
+
+    system, _ = item
+    return system.id
+
+
+class TestDeadlinePool(TestCase):
+    """Tests the deadline pool."""
+
+    def test_results(self):
+        """All systems are checked."""
+        items = [(SimpleNamespace(id=ident), None) for ident in range(5)]
+
+        with DeadlinePool(check, processes=2, deadline=10, grace=1) as pool:
+            self.assertEqual(sorted(pool.imap_unordered(items)), list(range(5)))
+
+    def test_zero_limit_fails(self):
+        """A limit of zero raises instead of restarting the pool forever."""
+        controller = ConcurrencyController(0, minimum=0, maximum=2)
+
+        with DeadlinePool(
+            check, deadline=10, grace=1, controller=controller
+        ) as pool:
+            with self.assertRaises(RuntimeError):
+                list(pool.imap_unordered([(SimpleNamespace(id=1), None)]))
+
+        self.assertEqual(pool.generation, 0)